@@ -1,20 +1,37 @@
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import FastAPI, HTTPException, Depends, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
-from db_connection.connect_Pinecone import search_similar_skills
-from typing import List
-from db_connection.connect_MySQL import SessionLocal, get_db
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import FileResponse, JSONResponse
+from typing import List, Optional
+from db_connection.connect_MySQL import SessionLocal, engine, get_db, check_max_connections, DB_POOL_SIZE
+from db_connection.executor import run_db, run_cpu
+from db_connection.shared_cache import get_shared_cache
+from db_connection.auth_tokens import AUTH_REQUIRED, REFRESH, TOKENS_ENABLED, create_token_pair, verify_token
+from db_connection.connect_Pinecone import SEARCH_CACHE_TOP_K, get_pinecone_client, ping_vector_index
+from db_crud.search_results import hydrate_search_results
+from db_crud.hybrid_search import hybrid_search, build_lexical_index
+from db_crud.lexical_index import lexical_index, get_lexical_index
+from db_crud.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, paginate, cached_count
+from db_crud.images import build_image_url, image_etag, etag_matches
+from db_crud.user_cards import user_card_select, fetch_user_cards, fetch_user_skill_names, serialize_user_card
+from db_crud.master_data import get_master_data
+from db_crud.bookmarks import BOOKMARK_BATCH_LIMIT, fetch_bookmarked_user_ids, annotate_bookmarks, add_bookmarks, remove_bookmarks
+from db_crud.skill_index import get_skill_index, parse_skill_names
+from db_crud.cache_tags import SKILLS, DEPARTMENTS, MASTER_DATA, skill_users_tag, department_users_tag, user_tag, user_list_tags
+from db_crud.thumbnails import THUMBNAIL_SIZES, choose_thumbnail_format, thumbnail_media_type, thumbnail_path, create_thumbnail
 from db_model.tables import SkillMaster, User as DBUser, PostSkill, Department as DBDepartment, Profile, Bookmark
-from sqlalchemy.orm import joinedload, Session
-from db_model.schemas import SkillMasterBase, SkillResponse, SearchResponse, UserResponse, UserDetailResponse, SearchResult, DepartmentResponse, DepartmentBase, BookmarkResponse, BookmarkListResponse, LoginRequest, LoginResponse
-import base64
+from sqlalchemy import func, select
+from sqlalchemy.orm import selectinload, contains_eager, Session
+from db_model.schemas import SkillMasterBase, SkillResponse, SkillQueryResponse, SkillSuggestResponse, SearchResponse, UserResponse, UserDetailResponse, SearchResult, DepartmentResponse, DepartmentBase, BookmarkResponse, BookmarkListResponse, LoginRequest, LoginResponse, TokenResponse, BookmarkStatusRequest, BookmarkStatusResponse, BookmarkWriteResponse, BookmarkBatchRequest, BookmarkBatchResponse
+import os
+import time
 import bcrypt
 import asyncio
+from contextlib import asynccontextmanager
 from functools import lru_cache
 import logging
 from contextvars import ContextVar
 from fastapi.logger import logger as fastapi_logger
-from aiocache import cached, Cache
-from aiocache.serializers import PickleSerializer
 
 # ロギング設定
 logging.basicConfig(
@@ -26,7 +43,89 @@ logger = logging.getLogger("app")
 # リクエストIDを追跡するためのコンテキスト変数
 request_id_context = ContextVar("request_id", default=None)
 
-app = FastAPI()
+# 起動時に事前に接続しておくDBコネクション数と、起動処理を待つ上限（秒）
+STARTUP_WARM_CONNECTIONS = int(os.getenv("STARTUP_WARM_CONNECTIONS", str(min(DB_POOL_SIZE, 5))))
+STARTUP_WARMUP_TIMEOUT = float(os.getenv("STARTUP_WARMUP_TIMEOUT", "30"))
+# /readyz で各バックエンドの応答を待つ上限（秒）
+READYZ_TIMEOUT = float(os.getenv("READYZ_TIMEOUT", "2"))
+
+# 起動処理の結果（/readyz で返す）
+startup_status = {}
+
+def _open_db_connection():
+    conn = engine.connect()
+    conn.exec_driver_sql("SELECT 1")
+    return conn
+
+async def _warm_db_pool():
+    """コネクションプールに接続を作っておく（同時に開くことで別々の接続にする）"""
+    connections = await asyncio.gather(
+        *(run_db(_open_db_connection) for _ in range(STARTUP_WARM_CONNECTIONS)),
+        return_exceptions=True
+    )
+    errors = [conn for conn in connections if isinstance(conn, BaseException)]
+    opened = [conn for conn in connections if not isinstance(conn, BaseException)]
+    try:
+        if opened:
+            # 全ワーカーの接続数の上限がMySQLのmax_connectionsに収まるか確認する
+            await run_db(check_max_connections, opened[0])
+    finally:
+        for conn in opened:
+            conn.close()  # プールに戻す
+    if errors:
+        raise errors[0]
+
+def _prefetch_master_data():
+    """マスタのスナップショットを読み込み、スキル・部署の一覧をキャッシュに載せ、プロセス内のインデックスを作成しておく"""
+    cache = get_shared_cache()
+    cache.get_or_set("skills", _read_skills, tags=[SKILLS])
+    cache.get_or_set("departments", _read_departments, tags=[DEPARTMENTS])
+    db = SessionLocal()
+    try:
+        get_master_data(db)
+        get_skill_index(db)
+        get_lexical_index(db)
+    finally:
+        db.close()
+
+async def _run_startup_step(name, step):
+    start_time = time.time()
+    try:
+        await step()
+        startup_status[name] = "ok"
+        logger.info(f"起動処理 '{name}' が完了しました: {time.time() - start_time:.2f}秒")
+    except Exception as e:
+        startup_status[name] = f"error: {e}"
+        logger.error(f"起動処理 '{name}' でエラーが発生: {e}")
+
+async def warm_up():
+    """
+    起動時にコネクションプール・マスタデータ・ベクトル検索クライアントを同時に準備する
+    失敗しても起動は止めず、各処理は最初のリクエストで改めて行われる
+    """
+    steps = {
+        "database": _warm_db_pool,
+        "master_data": lambda: run_db(_prefetch_master_data),
+        "vector_index": lambda: asyncio.to_thread(get_pinecone_client),
+    }
+    for name in steps:
+        startup_status[name] = "pending"
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(*(_run_startup_step(name, step) for name, step in steps.items())),
+            timeout=STARTUP_WARMUP_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        logger.warning(f"起動処理が{STARTUP_WARMUP_TIMEOUT}秒以内に完了しませんでした: {startup_status}")
+
+@asynccontextmanager
+async def lifespan(app):
+    # 準備が終わってからリクエストを受け付ける（最初のリクエストに初期化の待ち時間を負わせない）
+    await warm_up()
+    yield
+    engine.dispose()
+
+app = FastAPI(lifespan=lifespan)
 
 # CORSミドルウェア設定
 app.add_middleware(
@@ -46,6 +145,50 @@ async def request_id_middleware(request, call_next):
     response = await call_next(request)
     return response
 
+# Authorization: Bearer ヘッダー（ない場合もエラーにせず、各依存関数で判定する）
+bearer_scheme = HTTPBearer(auto_error=False)
+
+def _decode_credentials(credentials: Optional[HTTPAuthorizationCredentials]):
+    """Authorizationヘッダーのアクセストークンを検証してユーザーIDを返す（ヘッダーがなければNone）"""
+    if credentials is None:
+        return None
+    try:
+        return verify_token(credentials.credentials)
+    except ValueError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+
+def get_token_user_id(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)):
+    """アクセストークンを検証してユーザーIDを返す（ヘッダーがなければNone、DB・bcryptは使わない）"""
+    return _decode_credentials(credentials)
+
+def _check_user_access(user_id: int, token_user_id: Optional[int]):
+    """
+    user_idの情報へのアクセスを、本人のアクセストークンを持つリクエストに限定する
+    AUTH_REQUIRED=false の間はトークンのないリクエストも許可する（トークンがあれば本人か確認する）
+    """
+    if token_user_id is None:
+        if AUTH_REQUIRED:
+            raise HTTPException(status_code=401, detail="認証が必要です", headers={"WWW-Authenticate": "Bearer"})
+        return
+    if token_user_id != user_id:
+        raise HTTPException(status_code=403, detail="他のユーザーの情報は操作できません")
+
+def authorize_user(user_id: int, token_user_id: Optional[int] = Depends(get_token_user_id)):
+    """パスのuser_idに対する操作を本人に限定する"""
+    _check_user_access(user_id, token_user_id)
+
+def authorize_viewer(
+    viewer_id: Optional[int] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)
+):
+    """
+    一覧にブックマーク状態を付ける閲覧者（viewer_id）を本人に限定し、viewer_idを返す
+    viewer_idを指定しない一覧は認証不要のため、トークンはviewer_idがある場合だけ検証する
+    """
+    if viewer_id is not None:
+        _check_user_access(viewer_id, _decode_credentials(credentials))
+    return viewer_id
+
 # パスワードを検証する関数（NextOAuthとの連携用）
 def verify_password(plain_password, hashed_password):
     try:
@@ -59,9 +202,80 @@ def verify_password(plain_password, hashed_password):
         logger.error(f"パスワード検証エラー: {e}")
         return False
 
+# スキル組み合わせ検索API（/skills/{skill_name} より先に定義する）
+@app.get("/skills/query", response_model=SkillQueryResponse)
+async def query_skills(
+    all_skills: Optional[str] = Query(None, alias="all"),
+    any_skills: Optional[str] = Query(None, alias="any"),
+    none_skills: Optional[str] = Query(None, alias="none"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    return await run_db(
+        _query_skills,
+        parse_skill_names(all_skills), parse_skill_names(any_skills), parse_skill_names(none_skills),
+        limit, cursor
+    )
+
+def _query_skills(all_skills: List[str], any_skills: List[str], none_skills: List[str], limit: int, cursor: Optional[str]):
+    if not (all_skills or any_skills or none_skills):
+        raise HTTPException(status_code=400, detail="Specify at least one of all, any or none")
+    after_id = decode_cursor(cursor)
+    logger.info(f"スキル組み合わせ検索 - all={all_skills} any={any_skills} none={none_skills}")
+    db = SessionLocal()
+    try:
+        # 条件に合うユーザーをインデックスのビット演算で求める（SQLの結合は行わない）
+        index = get_skill_index(db)
+        matched = index.query(all_skills, any_skills, none_skills)
+        # カーソルは返したユーザーIDから作るため、インデックスの最大IDを超えるものは不正
+        try:
+            user_ids = index.page(matched, after_id, limit + 1)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        user_ids, next_cursor = paginate(user_ids, limit, key=lambda user_id: user_id)
+
+        # 該当ページのユーザーだけをカード表示用の列で取得
+        users = []
+        if user_ids:
+            rows, skills = fetch_user_cards(db, user_card_select().where(DBUser.id.in_(user_ids)).order_by(DBUser.id))
+            master = get_master_data(db)
+            users = [serialize_user_card(row, skills, master) for row in rows]
+
+        return SkillQueryResponse(
+            all=all_skills, any=any_skills, none=none_skills,
+            users=users, next_cursor=next_cursor, total=matched.bit_count()
+        )
+
+    finally:
+        db.close()
+
+# スキル名の入力補完API（/skills/{skill_name} より先に定義する）
+@app.get("/skills/suggest", response_model=SkillSuggestResponse)
+async def suggest_skills(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50)
+):
+    # インデックスが作成済みであればDBにもスレッドプールにも渡さずに返す
+    # 補完は/searchと同じ文字列インデックスの前方一致で求める
+    index = lexical_index
+    if index.is_stale():
+        index = await run_db(build_lexical_index)
+    return SkillSuggestResponse(query=q, suggestions=index.suggest(q, limit))
+
 # スキル検索API
 @app.get("/skills/{skill_name}", response_model=SkillResponse)
-async def read_skill(skill_name: str):
+async def read_skill(
+    skill_name: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    viewer_id: Optional[int] = Depends(authorize_viewer)
+):
+    # DB処理はDB用スレッドプールで実行し、イベントループをブロックしない
+    return await run_db(_read_skill, skill_name, limit, cursor, include_total, viewer_id)
+
+def _read_skill(skill_name: str, limit: int, cursor: Optional[str], include_total: bool, viewer_id: Optional[int] = None):
+    after_id = decode_cursor(cursor)
     logger.info(f"スキル検索 - {skill_name}")
     db = SessionLocal()
     try:
@@ -71,65 +285,63 @@ async def read_skill(skill_name: str):
             logger.warning(f"スキル '{skill_name}' は見つかりませんでした")
             raise HTTPException(status_code=404, detail="Skill not found")
 
-        # スキルを持つユーザーを取得
-        users_with_skill = (
-            db.query(DBUser)
-            .join(PostSkill, DBUser.id == PostSkill.user_id)
-            .join(Profile, DBUser.id == Profile.user_id)
-            .join(DBDepartment, Profile.department_id == DBDepartment.id)
-            .options(
-                joinedload(DBUser.profile).joinedload(Profile.department),
-                joinedload(DBUser.profile).joinedload(Profile.join_form),
-                joinedload(DBUser.profile).joinedload(Profile.welcome_level),
-                joinedload(DBUser.posted_skills).joinedload(PostSkill.skill)
-            )
-            .filter(PostSkill.skill_id == skill.skill_id)
-            .order_by(DBUser.id)  # 一貫した順序で結果を取得
-            .distinct()
-            .all()
+        def load():
+            # スキルを持つユーザーをカード表示用の列だけで取得
+            rows = db.execute(
+                user_card_select()
+                # PostSkillを結合せずサブクエリで絞り込むため、DISTINCTは不要
+                .where(DBUser.id.in_(select(PostSkill.user_id).where(PostSkill.skill_id == skill.skill_id)))
+                .where(Profile.department_id.isnot(None))  # 部署に所属するユーザーのみ
+                .where(DBUser.id > after_id)  # カーソル（前ページの最後のユーザーID）以降
+                .order_by(DBUser.id)  # 一貫した順序で結果を取得
+                .limit(limit + 1)  # 次ページの有無を判定するため1件多く取得
+            ).all()
+            rows, next_cursor = paginate(rows, limit, key=lambda row: row.user_id)
+
+            # 総件数は要求された場合のみ数える（ページとは別にキャッシュ）
+            total = None
+            if include_total:
+                total = cached_count(("skill", skill.skill_id), [skill_users_tag(skill.skill_id)], lambda: (
+                    db.query(func.count(PostSkill.user_id))
+                    .join(Profile, PostSkill.user_id == Profile.user_id)
+                    .filter(PostSkill.skill_id == skill.skill_id)
+                    .filter(Profile.department_id.isnot(None))
+                    .scalar()
+                ))
+
+            logger.info(f"スキル '{skill_name}' を持つユーザー: {len(rows)}人")
+
+            # スキル一覧は1回のIN (...)クエリでまとめて取得し、レスポンス用の辞書に変換
+            skills = fetch_user_skill_names(db, [row.user_id for row in rows])
+            master = get_master_data(db)
+            users = [serialize_user_card(row, skills, master) for row in rows]
+
+            return SkillResponse(name=skill_name, users=users, next_cursor=next_cursor, total=total)
+
+        # スキル検索後の一覧は共有キャッシュから返す
+        # （スキルの保有者・一覧に含まれるユーザー・マスタの変更で無効化される）
+        response = get_shared_cache().get_or_set(
+            ("skill", skill.skill_id, skill_name, limit, after_id, include_total),
+            load,
+            tags=[SKILLS, DEPARTMENTS, MASTER_DATA, skill_users_tag(skill.skill_id)],
+            result_tags=user_list_tags
         )
-
-        logger.info(f"スキル '{skill_name}' を持つユーザー: {len(users_with_skill)}人")
-
-        # レスポンス用のユーザーリストを作成
-        users = []
-        for user in users_with_skill:
-            # ユーザーのスキルを取得
-            user_skills = [ps.skill.name for ps in user.posted_skills]
-            profile = user.profile
-            
-            # 画像データをBase64エンコード
-            image_data = None
-            image_data_type = None
-            if profile and profile.image_data:
-                image_data = base64.b64encode(profile.image_data).decode('utf-8')
-                image_data_type = profile.image_data_type
-            
-            users.append(
-                UserResponse(
-                    id=user.id,
-                    name=user.name,
-                    department=profile.department.name if profile and profile.department else "未所属",
-                    yearsOfService=profile.career if profile else 0,
-                    skills=user_skills,
-                    description=profile.pr if profile else "",
-                    joinForm=profile.join_form.name if profile and profile.join_form else "未設定",
-                    welcome_level=profile.welcome_level.level_name if profile and profile.welcome_level else "未設定",
-                    image_data=image_data,
-                    image_data_type=image_data_type
-                )
-            )
-
-        response = SkillResponse(name=skill_name, users=users)
+        # 閲覧者のブックマーク状態はキャッシュせず、ページのユーザー分を1回のクエリで付ける
+        if viewer_id is not None:
+            response = response.model_copy(update={
+                "users": annotate_bookmarks(db, viewer_id, response.users, lambda user: user.id)
+            })
         return response
 
     finally:
         db.close()
 
-# 全スキル取得API (非同期キャッシュ)
+# 全スキル取得API (共有キャッシュ、スキルマスタの変更で無効化)
 @app.get("/skills", response_model=List[SkillMasterBase])
-@cached(ttl=3600)  # 1時間キャッシュ
 async def read_skills():
+    return await run_db(get_shared_cache().get_or_set, "skills", _read_skills, tags=[SKILLS])
+
+def _read_skills():
     logger.info("全スキル取得")
     db = SessionLocal()
     try:
@@ -143,197 +355,126 @@ async def read_skills():
 
 #ふわっと検索API
 @app.get("/search", response_model=SearchResponse)
-async def fuzzy_search(query: str, limit: int = 10, db: Session = Depends(get_db)):
+async def fuzzy_search(
+    query: str,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    viewer_id: Optional[int] = Depends(authorize_viewer)
+):
     """
-    ふわっと検索（ベクトル検索）でユーザーを検索
+    ふわっと検索（スキル名の文字列一致 + ベクトル検索）でユーザーを検索
+    一致したスキルを保有ユーザーに展開し、検索結果の順位順にoffset件目からlimit件を返す
     """
-    logger.info(f"ふわっと検索: クエリ='{query}', 上限={limit}")
+    logger.info(f"ふわっと検索: クエリ='{query}', 上限={limit}, 開始位置={offset}")
     
     try:
-        # Pineconeを使用して類似スキルを検索 (非同期化)
-        results = await asyncio.to_thread(search_similar_skills, query, limit)
-        logger.info(f"Pinecone検索結果: {len(results)}件")
+        # スキル名に一致すればその場で返し、それ以外はベクトル検索と統合 (エンベディング生成からベクトル検索まで非同期)
+        # スキルはoffset・limitによらず常にSEARCH_CACHE_TOP_K件を取得する
+        # （全ページで同じキャッシュ・同じ候補を使うため、ページ間で順位と総件数がずれない）
+        results = await hybrid_search(query, SEARCH_CACHE_TOP_K)
+        logger.info(f"スキル検索結果: {len(results)}件")
 
         # 検索結果がない場合
         if not results:
             logger.info(f"'{query}' の検索結果: 0件")
             return SearchResponse(results=[], total=0)
         
-        # 結果をフォーマット
-        search_results = []
-        for result in results:
-            skill_id = result.get("skill_id")
-            user_id = result.get("user_id")
-            
-            # スキルIDがある場合
-            if skill_id:
-                # スキルマスターからスキル情報を取得
-                skill = db.query(SkillMaster).filter(SkillMaster.skill_id == skill_id).first()
-                if not skill:
-                    logger.warning(f"スキルID {skill_id} が見つかりません")
-                    continue
-                
-                # ユーザーIDがある場合は特定のユーザーの情報を取得
-                if user_id:
-                    user = db.query(DBUser).filter(DBUser.id == user_id).first()
-                    if not user:
-                        logger.warning(f"ユーザーID {user_id} が見つかりません")
-                        continue
-                        
-                    # 部署情報を取得
-                    department_id = None
-                    department_name = None
-                    if user.profile and user.profile.department_id:
-                        department = db.query(DBDepartment).filter(DBDepartment.id == user.profile.department_id).first()
-                        if department:
-                            department_id = department.id
-                            department_name = department.name
-                    
-                    # 画像データをBase64エンコード
-                    image_data = None
-                    image_data_type = None
-                    if user.profile and user.profile.image_data:
-                        image_data = base64.b64encode(user.profile.image_data).decode('utf-8')
-                        image_data_type = user.profile.image_data_type
-                            
-                    # 検索結果を作成
-                    search_result = SearchResult(
-                        user_id=user.id,
-                        user_name=user.name or "名前なし",
-                        skill_id=skill.skill_id,
-                        skill_name=skill.name,
-                        joinForm=user.profile.join_form.name if user.profile and user.profile.join_form else "未設定",
-                        welcome_level=user.profile.welcome_level.level_name if user.profile and user.profile.welcome_level else "未設定",
-                        description=None,
-                        department_id=department_id,
-                        department_name=department_name,
-                        similarity_score=result.get("score", 0.0),
-                        image_data=image_data,
-                        image_data_type=image_data_type
-                    )
-                    search_results.append(search_result)
-                
-                # ユーザーIDがない場合は、このスキルを持つすべてのユーザーを取得
-                else:
-                    # スキルに関連付けられたポストスキルを全て取得
-                    post_skills = db.query(PostSkill).filter(PostSkill.skill_id == skill_id).all()
-                    if not post_skills:
-                        logger.warning(f"スキルID {skill_id} に関連するポストスキルが見つかりません")
-                        continue
-                        
-                    # 各ポストスキルからユーザー情報を取得して結果に追加
-                    for post_skill in post_skills:
-                        user = db.query(DBUser).filter(DBUser.id == post_skill.user_id).first()
-                        if not user:
-                            logger.warning(f"ユーザーID {post_skill.user_id} が見つかりません")
-                            continue
-                            
-                        # 部署情報を取得
-                        department_id = None
-                        department_name = None
-                        if user.profile and user.profile.department_id:
-                            department = db.query(DBDepartment).filter(DBDepartment.id == user.profile.department_id).first()
-                            if department:
-                                department_id = department.id
-                                department_name = department.name
-                        
-                        # 画像データをBase64エンコード
-                        image_data = None
-                        image_data_type = None
-                        if user.profile and user.profile.image_data:
-                            image_data = base64.b64encode(user.profile.image_data).decode('utf-8')
-                            image_data_type = user.profile.image_data_type
-                        
-                        # 検索結果を作成
-                        search_result = SearchResult(
-                            user_id=user.id,
-                            user_name=user.name or "名前なし",
-                            skill_id=skill.skill_id,
-                            skill_name=skill.name,
-                            joinForm=user.profile.join_form.name if user.profile and user.profile.join_form else "未設定",
-                            welcome_level=user.profile.welcome_level.level_name if user.profile and user.profile.welcome_level else "未設定",
-                            description=None,
-                            department_id=department_id,
-                            department_name=department_name,
-                            similarity_score=result.get("score", 0.0),
-                            image_data=image_data,
-                            image_data_type=image_data_type
-                        )
-                        search_results.append(search_result)
-        
-        logger.info(f"整形後の検索結果: {len(search_results)}件")
+        # 結果をまとめてDBから取得してフォーマット (DB用スレッドプールで実行し、共有キャッシュの確認もイベントループをブロックしない)
+        # スキル単位の結果は保有ユーザーに展開し、展開後の一覧からページ分だけを取り出す
+        search_results, total = await run_db(_hydrate_search_page, results, offset, limit, viewer_id)
+
+        logger.info(f"整形後の検索結果: {len(search_results)}件 / {total}件")
         return SearchResponse(
             results = search_results,
-            total = len(search_results))
+            total = total,
+            next_offset = offset + limit if offset + limit < total else None)
     except Exception as e:
         logger.error(f"検索処理中にエラーが発生: {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"検索エラー: {str(e)}")
 
+def _hydrate_search_page(results, offset: int, limit: int, viewer_id: Optional[int]):
+    db = SessionLocal()
+    try:
+        search_results, total = hydrate_search_results(db, results, offset, limit)
+        # viewer_idの指定があれば、同じセッションで閲覧者のブックマーク状態を付ける
+        if viewer_id is not None:
+            search_results = annotate_bookmarks(db, viewer_id, search_results, lambda result: result.user_id)
+        return search_results, total
+    finally:
+        db.close()
+
 #部署検索API
 @app.get("/departments/{department_name}", response_model=DepartmentResponse)
-async def read_department(department_name: str):
+async def read_department(
+    department_name: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    viewer_id: Optional[int] = Depends(authorize_viewer)
+):
+    return await run_db(_read_department, department_name, limit, cursor, include_total, viewer_id)
+
+def _read_department(department_name: str, limit: int, cursor: Optional[str], include_total: bool, viewer_id: Optional[int] = None):
+    after_id = decode_cursor(cursor)
     db = SessionLocal()
     try:
         department = db.query(DBDepartment).filter(DBDepartment.name == department_name).first()
         if not department:
             raise HTTPException(status_code=404, detail="Department not found")
 
-        # 所属ユーザーを取得
-        users_in_department = (
-            db.query(DBUser)
-            .join(Profile, DBUser.id == Profile.user_id)
-            .options(
-                joinedload(DBUser.profile).joinedload(Profile.department),
-                joinedload(DBUser.profile).joinedload(Profile.join_form),
-                joinedload(DBUser.profile).joinedload(Profile.welcome_level),
-                joinedload(DBUser.posted_skills).joinedload(PostSkill.skill)
-            )
-            .filter(Profile.department_id == department.id)
-            .order_by(DBUser.id)  # 一貫した順序で結果を取得
-            .all()
+        def load():
+            # 所属ユーザーをカード表示用の列だけで取得
+            rows = db.execute(
+                user_card_select()
+                .where(Profile.department_id == department.id)
+                .where(DBUser.id > after_id)  # カーソル（前ページの最後のユーザーID）以降
+                .order_by(DBUser.id)  # 一貫した順序で結果を取得
+                .limit(limit + 1)  # 次ページの有無を判定するため1件多く取得
+            ).all()
+            rows, next_cursor = paginate(rows, limit, key=lambda row: row.user_id)
+
+            # 総件数は要求された場合のみ数える（ページとは別にキャッシュ）
+            total = None
+            if include_total:
+                total = cached_count(("department", department.id), [department_users_tag(department.id)], lambda: (
+                    db.query(func.count(Profile.user_id))
+                    .filter(Profile.department_id == department.id)
+                    .scalar()
+                ))
+
+            # スキル一覧は1回のIN (...)クエリでまとめて取得し、レスポンス用の辞書に変換
+            skills = fetch_user_skill_names(db, [row.user_id for row in rows])
+            master = get_master_data(db)
+            users = [serialize_user_card(row, skills, master) for row in rows]
+
+            return DepartmentResponse(name=department_name, users=users, next_cursor=next_cursor, total=total)
+
+        # 部署検索後の一覧は共有キャッシュから返す
+        # （所属ユーザー・一覧に含まれるユーザー・マスタの変更で無効化される）
+        response = get_shared_cache().get_or_set(
+            ("department", department.id, department_name, limit, after_id, include_total),
+            load,
+            tags=[SKILLS, DEPARTMENTS, MASTER_DATA, department_users_tag(department.id)],
+            result_tags=user_list_tags
         )
-
-        # レスポンス用のユーザーリストを作成
-        users = []
-        for user in users_in_department:
-            # ユーザーのスキルを取得
-            user_skills = [ps.skill.name for ps in user.posted_skills]
-            profile = user.profile
-
-            # 画像データをBase64エンコード
-            image_data = None
-            image_data_type = None
-            if profile and profile.image_data:
-                image_data = base64.b64encode(profile.image_data).decode('utf-8')
-                image_data_type = profile.image_data_type
-
-            users.append(
-                UserResponse(
-                    id=user.id,
-                    name=user.name,
-                    department=profile.department.name if profile and profile.department else "未所属",
-                    yearsOfService=profile.career if profile else 0,
-                    skills=user_skills,
-                    description=profile.pr if profile else "",
-                    joinForm=profile.join_form.name if profile and profile.join_form else "未設定",
-                    welcome_level=profile.welcome_level.level_name if profile and profile.welcome_level else "未設定",
-                    image_data=image_data,
-                    image_data_type=image_data_type
-                )
-            )
-
-        response = DepartmentResponse(name=department_name, users=users)
+        # 閲覧者のブックマーク状態はキャッシュせず、ページのユーザー分を1回のクエリで付ける
+        if viewer_id is not None:
+            response = response.model_copy(update={
+                "users": annotate_bookmarks(db, viewer_id, response.users, lambda user: user.id)
+            })
         return response
 
     finally:
         db.close()
 
-# 全部署取得API (非同期キャッシュ)
+# 全部署取得API (共有キャッシュ、部署マスタの変更で無効化)
 @app.get("/departments", response_model=List[DepartmentBase])
-@cached(ttl=3600)  # 1時間キャッシュ
 async def read_departments():
+    return await run_db(get_shared_cache().get_or_set, "departments", _read_departments, tags=[DEPARTMENTS])
+
+def _read_departments():
     logger.info("全部署取得")
     db = SessionLocal()
     try:
@@ -347,20 +488,60 @@ async def read_departments():
 async def read_root():
     return {"message": "Welcome to Chotto API"}
 
+# 死活監視API（プロセスが応答できればよく、DBなどには接続しない）
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+# 準備完了確認API（DBとベクトル検索のバックエンドに実際に問い合わせ、応答がなければ503を返す）
+@app.get("/readyz")
+async def readyz():
+    checks = {}
+    probes = {
+        "database": lambda: run_db(_ping_database),
+        "vector_index": lambda: asyncio.to_thread(ping_vector_index),
+    }
+    for name, probe in probes.items():
+        try:
+            await asyncio.wait_for(probe(), timeout=READYZ_TIMEOUT)
+            checks[name] = "ok"
+        except asyncio.TimeoutError:
+            checks[name] = f"error: {READYZ_TIMEOUT}秒以内に応答がありません"
+        except Exception as e:
+            checks[name] = f"error: {e}"
+
+    ready = all(status == "ok" for status in checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ok" if ready else "unavailable", "checks": checks, "startup": startup_status}
+    )
+
+def _ping_database():
+    with engine.connect() as conn:
+        conn.exec_driver_sql("SELECT 1")
+
 # ユーザー詳細取得API
 @app.get("/users/{user_id}", response_model=UserDetailResponse)
 async def get_user_detail(user_id: int, db: Session = Depends(get_db)):
+    # ユーザー詳細は共有キャッシュから返す（ユーザー・プロフィール・スキル・マスタの変更で無効化）
+    return await run_db(
+        get_shared_cache().get_or_set,
+        ("user", user_id),
+        lambda: _get_user_detail(user_id, db),
+        tags=[SKILLS, DEPARTMENTS, MASTER_DATA, user_tag(user_id)]
+    )
+
+def _get_user_detail(user_id: int, db: Session):
+    # 部署・入社形態・歓迎度・スキルの名前はマスタのスナップショットから引く（マスタは結合しない）
     user = (
         db.query(DBUser)
         .join(Profile, DBUser.id == Profile.user_id)
-        .join(DBDepartment, Profile.department_id == DBDepartment.id)
         .options(
-            joinedload(DBUser.profile).joinedload(Profile.department),
-            joinedload(DBUser.profile).joinedload(Profile.join_form),
-            joinedload(DBUser.profile).joinedload(Profile.welcome_level),
-            joinedload(DBUser.posted_skills).joinedload(PostSkill.skill)
+            contains_eager(DBUser.profile).undefer(Profile.pr),
+            selectinload(DBUser.posted_skills)
         )
         .filter(DBUser.id == user_id)
+        .filter(Profile.department_id.isnot(None))  # 部署に所属するユーザーのみ
         .first()
     )
 
@@ -368,14 +549,13 @@ async def get_user_detail(user_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="User not found")
 
     profile = user.profile
-    user_skills = [ps.skill.name for ps in user.posted_skills]
+    skill_ids = [ps.skill_id for ps in user.posted_skills]
+    master = get_master_data(db, skill_ids)
+    user_skills = [master.skills[skill_id] for skill_id in skill_ids if skill_id in master.skills]
 
-    # 画像データをBase64エンコード
-    image_data = None
-    image_data_type = None
-    if profile and profile.image_data:
-        image_data = base64.b64encode(profile.image_data).decode('utf-8')
-        image_data_type = profile.image_data_type
+    # 画像は専用エンドポイントから取得するためURLのみ返す
+    image_url = build_image_url(user.id, profile)
+    image_data_type = profile.image_data_type if image_url else None
 
     # 経験・実績のダミーデータ
     experiences = [
@@ -392,128 +572,180 @@ async def get_user_detail(user_id: int, db: Session = Depends(get_db)):
     return UserDetailResponse(
         id=user.id,
         name=user.name,
-        department=profile.department.name if profile and profile.department else "未所属",
+        department=master.departments.get(profile.department_id) or "未所属",
         position="マーケティング部 / プロジェクトマネージャー",  # ダミーデータ
         yearsOfService=profile.career if profile else 0,
-        joinForm=profile.join_form.name if profile and profile.join_form else "未設定",
+        joinForm=master.join_forms.get(profile.join_form_id) or "未設定",
         skills=user_skills,
         experiences=experiences,
         description=profile.pr if profile else None,
-        image_data=image_data,
+        image_url=image_url,
         image_data_type=image_data_type,
-        welcome_level=profile.welcome_level.level_name if profile and profile.welcome_level else None
+        welcome_level=master.welcome_levels.get(profile.welcome_level_id)
     )
 
-# 画像取得用の専用エンドポイント（代替手段として残す）
+# 画像取得用の専用エンドポイント
 @app.get("/users/{user_id}/image")
-async def get_user_image(user_id: int, db: Session = Depends(get_db)):
+async def get_user_image(user_id: int, request: Request, v: Optional[str] = None, size: Optional[int] = None, db: Session = Depends(get_db)):
     """
-    個別に画像データのみを取得するためのエンドポイント。
-    メインAPIで画像を取得できるようになったが、軽量化のために別途取得したい場合に使用。
+    プロフィール画像をバイナリでそのまま返すエンドポイント。
+    一覧APIは画像URL（?v=バージョン）のみを返すため、画像本体はここから取得する。
+    ETag（Profile.updated_atから作成）による条件付きリクエスト（304）に対応。
+    size（64 / 128 / 256）を指定すると正方形のサムネイル（WebPまたはJPEG）を返す。
     """
-    user = db.query(DBUser).join(Profile, DBUser.id == Profile.user_id).filter(DBUser.id == user_id).first()
-    
-    if not user or not user.profile or not user.profile.image_data:
+    if size is not None and size not in THUMBNAIL_SIZES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"size は {', '.join(str(s) for s in THUMBNAIL_SIZES)} のいずれかを指定してください"
+        )
+
+    # まず更新日時だけを取得してETagを確認（画像本体は読み込まない）
+    profile = await run_db(_get_user_image_version, user_id, db)
+    if not profile or not profile.has_image:
         raise HTTPException(status_code=404, detail="User image not found")
-    
-    image_data = base64.b64encode(user.profile.image_data).decode('utf-8')
-    image_data_type = user.profile.image_data_type
-    
-    return {
-        "image_data": image_data,
-        "image_data_type": image_data_type
-    }
 
-# ブックマーク追加API
-@app.post("/bookmarks/{user_id}", response_model=BookmarkResponse)
-async def create_bookmark(user_id: int, bookmarked_user_id: int, db: Session = Depends(get_db)):
-    # すでにブックマークされているかチェック
-    existing_bookmark = db.query(Bookmark).filter(
-        Bookmark.bookmarking_user_id == user_id,
-        Bookmark.bookmarked_user_id == bookmarked_user_id
-    ).first()
-    
-    if existing_bookmark:
-        raise HTTPException(status_code=400, detail="Bookmark already exists")
+    version = image_etag(user_id, profile.updated_at)
+    fmt = choose_thumbnail_format(request.headers.get("accept")) if size else None
+    etag = f'"{version}-{size}-{fmt}"' if size else f'"{version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if size:
+        headers["Vary"] = "Accept"
+    # URLのバージョンが最新の画像と一致する場合は長期間キャッシュさせる
+    if v == version:
+        headers["Cache-Control"] = "public, max-age=31536000, immutable"
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    # サムネイル: キャッシュ済みのファイルがあれば画像本体を読み込まずに返す
+    image = None
+    if size:
+        path = thumbnail_path(user_id, version, size, fmt)
+        if path.exists():
+            return FileResponse(path, media_type=thumbnail_media_type(fmt), headers=headers)
+        image = await run_db(_get_user_image_data, user_id, db)
+        if not image or not image.image_data:
+            raise HTTPException(status_code=404, detail="User image not found")
+        path = await run_cpu(create_thumbnail, image.image_data, user_id, version, size, fmt)
+        if path is not None:
+            return FileResponse(path, media_type=thumbnail_media_type(fmt), headers=headers)
+        # サムネイルを作成できない画像（SVGなど）は元の画像をそのまま返す
+
+    if image is None:
+        image = await run_db(_get_user_image_data, user_id, db)
+    if not image or not image.image_data:
+        raise HTTPException(status_code=404, detail="User image not found")
 
-    # 新しいブックマークを作成
-    bookmark = Bookmark(
-        bookmarking_user_id=user_id,
-        bookmarked_user_id=bookmarked_user_id
+    return Response(
+        content=image.image_data,
+        media_type=image.image_data_type or "application/octet-stream",
+        headers=headers
+    )
+
+def _get_user_image_version(user_id: int, db: Session):
+    return (
+        db.query(Profile.updated_at, Profile.has_image)
+        .filter(Profile.user_id == user_id)
+        .first()
     )
-    db.add(bookmark)
-    db.commit()
-    db.refresh(bookmark)
 
-    return bookmark
+def _get_user_image_data(user_id: int, db: Session):
+    return (
+        db.query(Profile.image_data, Profile.image_data_type)
+        .filter(Profile.user_id == user_id)
+        .first()
+    )
 
-# ブックマーク削除API
-@app.delete("/bookmarks/{user_id}", response_model=BookmarkResponse)
+# ブックマーク追加API（登録済みの場合もエラーにせず、changed=falseを返す）
+@app.post("/bookmarks/{user_id}", response_model=BookmarkWriteResponse, dependencies=[Depends(authorize_user)])
+async def create_bookmark(user_id: int, bookmarked_user_id: int, db: Session = Depends(get_db)):
+    return await run_db(_create_bookmark, user_id, bookmarked_user_id, db)
+
+def _create_bookmark(user_id: int, bookmarked_user_id: int, db: Session):
+    # 存在確認・重複確認を含めて1文で追加する
+    added = add_bookmarks(db, user_id, [bookmarked_user_id])
+    db.commit()
+    return BookmarkWriteResponse(bookmarking_user_id=user_id, bookmarked_user_id=bookmarked_user_id, changed=added > 0)
+
+# ブックマーク削除API（未登録の場合もエラーにせず、changed=falseを返す）
+@app.delete("/bookmarks/{user_id}", response_model=BookmarkWriteResponse, dependencies=[Depends(authorize_user)])
 async def delete_bookmark(user_id: int, bookmarked_user_id: int, db: Session = Depends(get_db)):
-    bookmark = db.query(Bookmark).filter(
-        Bookmark.bookmarking_user_id == user_id,
-        Bookmark.bookmarked_user_id == bookmarked_user_id
-    ).first()
+    return await run_db(_delete_bookmark, user_id, bookmarked_user_id, db)
 
-    if not bookmark:
-        raise HTTPException(status_code=404, detail="Bookmark not found")
-    
-    db.delete(bookmark)
+def _delete_bookmark(user_id: int, bookmarked_user_id: int, db: Session):
+    removed = remove_bookmarks(db, user_id, [bookmarked_user_id])
     db.commit()
-    
-    return {"message": "Bookmark deleted successfully"}
+    return BookmarkWriteResponse(bookmarking_user_id=user_id, bookmarked_user_id=bookmarked_user_id, changed=removed > 0)
+
+# ブックマーク一括更新API（追加・削除をまとめて1つのトランザクションで反映）
+@app.patch("/bookmarks/{user_id}", response_model=BookmarkBatchResponse, dependencies=[Depends(authorize_user)])
+async def update_bookmarks(user_id: int, body: BookmarkBatchRequest, db: Session = Depends(get_db)):
+    if len(body.add) > BOOKMARK_BATCH_LIMIT or len(body.remove) > BOOKMARK_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"add・remove はそれぞれ{BOOKMARK_BATCH_LIMIT}件以内で指定してください")
+    if set(body.add) & set(body.remove):
+        raise HTTPException(status_code=400, detail="同じユーザーを add と remove の両方に指定することはできません")
+    return await run_db(_update_bookmarks, user_id, body.add, body.remove, db)
+
+def _update_bookmarks(user_id: int, add: List[int], remove: List[int], db: Session):
+    try:
+        # 追加・削除それぞれ1文で実行する
+        added = add_bookmarks(db, user_id, add)
+        removed = remove_bookmarks(db, user_id, remove)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    logger.info(f"ブックマーク一括更新 - ユーザー {user_id}: 追加 {added}件, 削除 {removed}件")
+    return BookmarkBatchResponse(added=added, removed=removed)
 
 # ブックマーク一覧取得API
-@app.get("/bookmarks/{user_id}", response_model=BookmarkListResponse)
+@app.get("/bookmarks/{user_id}", response_model=BookmarkListResponse, dependencies=[Depends(authorize_user)])
 async def get_bookmarks(user_id: int, db: Session = Depends(get_db)):
-    bookmarks = (
-        db.query(Bookmark)
-        .filter(Bookmark.bookmarking_user_id == user_id)
-        .options(
-            joinedload(Bookmark.bookmarked).joinedload(DBUser.profile).joinedload(Profile.department),
-            joinedload(Bookmark.bookmarked).joinedload(DBUser.profile).joinedload(Profile.join_form),
-            joinedload(Bookmark.bookmarked).joinedload(DBUser.profile).joinedload(Profile.welcome_level),
-            joinedload(Bookmark.bookmarked).joinedload(DBUser.posted_skills).joinedload(PostSkill.skill)
-        )
-        .all()
+    return await run_db(_get_bookmarks, user_id, db)
+
+def _get_bookmarks(user_id: int, db: Session):
+    # ブックマークしたユーザーをカード表示用の列だけで取得
+    rows, skills = fetch_user_cards(
+        db,
+        user_card_select(Bookmark.id.label("bookmark_id"), Bookmark.created_at.label("bookmarked_at"))
+        .join(Bookmark, Bookmark.bookmarked_user_id == DBUser.id)
+        .where(Bookmark.bookmarking_user_id == user_id)
+        .order_by(Bookmark.id)
     )
+    master = get_master_data(db)
 
     Bookmark_list = []
-    for bookmark in bookmarks:
-        user = bookmark.bookmarked
-        profile = user.profile
-        user_skills = [ps.skill.name for ps in user.posted_skills]
-
-        # 画像データをBase64エンコード
-        image_data = None
-        image_data_type = None
-        if profile and profile.image_data:
-            image_data = base64.b64encode(profile.image_data).decode('utf-8')
-            image_data_type = profile.image_data_type
-
-        Bookmark_list.append(
-            BookmarkResponse(
-                id=bookmark.id,
-                user_id=bookmark.bookmarking_user_id,
-                bookmarking_user_id=bookmark.bookmarking_user_id,
-                bookmarked_user_id=user.id,
-                name=user.name,
-                department=profile.department.name if profile and profile.department else "未所属",
-                yearsOfService=profile.career if profile else 0,
-                skills=user_skills,
-                description=profile.pr if profile else "",
-                joinForm=profile.join_form.name if profile and profile.join_form else "未設定",
-                welcome_level=profile.welcome_level.level_name if profile and profile.welcome_level else "未設定",
-                created_at=bookmark.created_at,
-                image_data=image_data,
-                image_data_type=image_data_type
-            ))
+    for row in rows:
+        card = serialize_user_card(row, skills, master)
+        # idはブックマークのIDに置き換える
+        card.update(
+            id=row.bookmark_id,
+            user_id=user_id,
+            bookmarking_user_id=user_id,
+            bookmarked_user_id=row.user_id,
+            created_at=row.bookmarked_at
+        )
+        Bookmark_list.append(BookmarkResponse(**card))
 
     return BookmarkListResponse(bookmarks=Bookmark_list, total=len(Bookmark_list))
 
+# ブックマーク状態の一括確認API（カードごとに状態確認APIを呼ばず、1回のIN (...)クエリで返す）
+@app.post("/bookmarks/{user_id}/status", response_model=BookmarkStatusResponse, dependencies=[Depends(authorize_user)])
+async def check_bookmark_statuses(user_id: int, body: BookmarkStatusRequest, db: Session = Depends(get_db)):
+    if len(body.user_ids) > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"user_ids は{MAX_PAGE_SIZE}件以内で指定してください")
+    return await run_db(_check_bookmark_statuses, user_id, body.user_ids, db)
+
+def _check_bookmark_statuses(user_id: int, user_ids: List[int], db: Session):
+    bookmarked = fetch_bookmarked_user_ids(db, user_id, user_ids)
+    return BookmarkStatusResponse(statuses={target_user_id: target_user_id in bookmarked for target_user_id in user_ids})
+
 # ブックマーク状態確認API
-@app.get("/bookmarks/{user_id}/{bookmarked_user_id}/status")
+@app.get("/bookmarks/{user_id}/{bookmarked_user_id}/status", dependencies=[Depends(authorize_user)])
 async def check_bookmark_status(user_id: int, bookmarked_user_id: int, db: Session = Depends(get_db)):
+    return await run_db(_check_bookmark_status, user_id, bookmarked_user_id, db)
+
+def _check_bookmark_status(user_id: int, bookmarked_user_id: int, db: Session):
     bookmark = db.query(Bookmark).filter(
         Bookmark.bookmarking_user_id == user_id,
         Bookmark.bookmarked_user_id == bookmarked_user_id
@@ -522,9 +754,12 @@ async def check_bookmark_status(user_id: int, bookmarked_user_id: int, db: Sessi
     return {"is_bookmarked": bookmark is not None}
 
 # ログインAPI
-@app.post("/auth/login")
+@app.post("/auth/login", response_model=LoginResponse)
 async def login(request: Request, db: Session = Depends(get_db)):
-    """ユーザー認証を行い、認証情報を返す"""
+    """
+    ユーザー認証を行い、認証情報とアクセストークン・リフレッシュトークンを返す
+    以降のリクエストはアクセストークンで認証し、期限が切れたら /auth/refresh で更新する（bcryptはログイン時のみ）
+    """
     data = await request.json()
     email = data.get("email")
     password = data.get("password")
@@ -532,12 +767,12 @@ async def login(request: Request, db: Session = Depends(get_db)):
     if not email or not password:
         raise HTTPException(status_code=400, detail="メールアドレスとパスワードは必須です")
     
-    user = db.query(DBUser).filter(DBUser.email == email).first()
+    user = await run_db(lambda: db.query(DBUser).filter(DBUser.email == email).first())
     if not user:
         raise HTTPException(status_code=401, detail="メールアドレスまたはパスワードが正しくありません")
     
-    # パスワードの検証
-    if not verify_password(password, user.password_hash):
+    # パスワードの検証（bcryptはCPU用スレッドプールで実行）
+    if not await run_cpu(verify_password, password, user.password_hash):
         raise HTTPException(status_code=401, detail="メールアドレスまたはパスワードが正しくありません")
     
     # 認証成功
@@ -546,5 +781,23 @@ async def login(request: Request, db: Session = Depends(get_db)):
         "name": user.name,
         "email": user.email,
         "success": True,
-        "message": "認証に成功しました"
-    }
\ No newline at end of file
+        "message": "認証に成功しました",
+        **(create_token_pair(user.id) if TOKENS_ENABLED else {})
+    }
+
+# トークン更新API（リフレッシュトークンから新しいトークンを発行、パスワードの検証は行わない）
+@app.post("/auth/refresh", response_model=TokenResponse)
+async def refresh_token(request: Request):
+    data = await request.json()
+    token = data.get("refresh_token")
+    if not token:
+        raise HTTPException(status_code=400, detail="リフレッシュトークンは必須です")
+    if not TOKENS_ENABLED:
+        raise HTTPException(status_code=503, detail="トークンの発行が設定されていません")
+
+    try:
+        user_id = verify_token(token, REFRESH)
+    except ValueError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+
+    return create_token_pair(user_id)
\ No newline at end of file
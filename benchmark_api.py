@@ -0,0 +1,64 @@
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+# 計測対象のAPIと同時実行数
+BASE_URL = "http://localhost:8000"
+DEFAULT_PATHS = ["/skills", "/departments", "/users/1", "/bookmarks/1"]
+CONCURRENCY_LEVELS = [1, 4, 16, 32]
+REQUESTS_PER_LEVEL = 200
+
+def run_level(session_factory, urls, concurrency, total):
+    """指定した同時実行数でリクエストを送り、スループットとレイテンシを返す"""
+    latencies = []
+    errors = 0
+
+    def worker(i):
+        session = session_factory()
+        url = urls[i % len(urls)]
+        start = time.perf_counter()
+        response = session.get(url, timeout=30)
+        return response.status_code, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for status_code, latency in executor.map(worker, range(total)):
+            latencies.append(latency)
+            if status_code >= 500:
+                errors += 1
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "throughput": total / elapsed,
+        "p50": latencies[len(latencies) // 2] * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "errors": errors,
+    }
+
+def benchmark_api(base_url=BASE_URL, paths=DEFAULT_PATHS):
+    """同時実行数を増やしたときにスループットが伸びるか（直列化していないか）を確認"""
+    urls = [base_url + path for path in paths]
+    print(f"ベンチマーク対象: {', '.join(urls)}")
+
+    local = threading.local()
+
+    def session_factory():
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return local.session
+
+    for concurrency in CONCURRENCY_LEVELS:
+        result = run_level(session_factory, urls, concurrency, REQUESTS_PER_LEVEL)
+        print(
+            f"- 同時実行数 {concurrency:>3}: {result['throughput']:.1f} req/s, "
+            f"p50 {result['p50']:.1f}ms, p95 {result['p95']:.1f}ms, エラー {result['errors']}件"
+        )
+
+if __name__ == "__main__":
+    # 使い方: python benchmark_api.py [BASE_URL] [PATH ...]
+    base_url = sys.argv[1] if len(sys.argv) > 1 else BASE_URL
+    paths = sys.argv[2:] or DEFAULT_PATHS
+    benchmark_api(base_url, paths)
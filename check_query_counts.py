@@ -0,0 +1,121 @@
+import os
+import sys
+
+# 計測中は前回までの共有キャッシュを使わず、必ずDBに問い合わせる（プロセス内のキャッシュのみ使用）
+os.environ["CACHE_URL"] = "memory"
+
+from sqlalchemy import func
+from db_connection.connect_MySQL import SessionLocal, engine
+from db_crud.query_stats import record_queries
+from db_crud.pagination import MAX_PAGE_SIZE
+from db_crud.master_data import get_master_data
+from db_model.tables import PostSkill, SkillMaster, Profile, Department, Bookmark
+import app
+
+# エンドポイントごとのSQL文数の上限（ページサイズやスキル数に依存しないこと）
+STATEMENT_BUDGETS = {
+    "/skills/{skill_name}": 3,  # スキル検索 + ユーザー + スキル一覧（IN）
+    "/departments/{department_name}": 3,  # 部署検索 + ユーザー + スキル一覧（IN）
+    "/users/{user_id}": 2,  # ユーザー + スキル一覧（IN）
+    "/bookmarks/{user_id}": 2,  # ブックマーク + スキル一覧（IN）
+}
+
+# 取得行数の上限に加える余裕（スキル・部署の検索など1行のクエリ分）
+ROW_SLACK = 2
+
+def pick_samples(db):
+    """件数の多いスキル・部署・ブックマークを計測対象に選ぶ"""
+    skill_name = (
+        db.query(SkillMaster.name)
+        .join(PostSkill, PostSkill.skill_id == SkillMaster.skill_id)
+        .group_by(SkillMaster.skill_id, SkillMaster.name)
+        .order_by(func.count(PostSkill.id).desc())
+        .limit(1)
+        .scalar()
+    )
+    department_name = (
+        db.query(Department.name)
+        .join(Profile, Profile.department_id == Department.id)
+        .group_by(Department.id, Department.name)
+        .order_by(func.count(Profile.user_id).desc())
+        .limit(1)
+        .scalar()
+    )
+    bookmarking_user_id = (
+        db.query(Bookmark.bookmarking_user_id)
+        .group_by(Bookmark.bookmarking_user_id)
+        .order_by(func.count(Bookmark.id).desc())
+        .limit(1)
+        .scalar()
+    )
+    detail_user_id = (
+        db.query(PostSkill.user_id)
+        .group_by(PostSkill.user_id)
+        .order_by(func.count(PostSkill.id).desc())
+        .limit(1)
+        .scalar()
+    )
+    return skill_name, department_name, bookmarking_user_id, detail_user_id
+
+def expected_rows(users):
+    """ユーザー1人につき1行 + 保有スキル1件につき1行"""
+    return len(users) + sum(len(user.skills or []) for user in users) + ROW_SLACK
+
+def build_cases(db, include_total=False):
+    """計測対象のエンドポイントごとに (エンドポイント, 引数, 呼び出し) を作成"""
+    skill_name, department_name, bookmarking_user_id, detail_user_id = pick_samples(db)
+    # マスタのスナップショットは起動時に読み込まれるプロセス共通のものなので、計測前に読み込んでおく
+    get_master_data(db)
+
+    cases = []
+    if skill_name:
+        cases.append(("/skills/{skill_name}", skill_name,
+                      lambda: app._read_skill(skill_name, MAX_PAGE_SIZE, None, include_total).users))
+    if department_name:
+        cases.append(("/departments/{department_name}", department_name,
+                      lambda: app._read_department(department_name, MAX_PAGE_SIZE, None, include_total).users))
+    if detail_user_id:
+        cases.append(("/users/{user_id}", detail_user_id,
+                      lambda: [app._get_user_detail(detail_user_id, db)]))
+    if bookmarking_user_id:
+        cases.append(("/bookmarks/{user_id}", bookmarking_user_id,
+                      lambda: app._get_bookmarks(bookmarking_user_id, db).bookmarks))
+    return cases
+
+def check_query_counts():
+    """各エンドポイントのSQL文数と取得行数が上限内か確認"""
+    db = SessionLocal()
+    failures = []
+
+    try:
+        cases = build_cases(db)
+
+        for endpoint, argument, call in cases:
+            db.expunge_all()
+            with record_queries(engine) as stats:
+                users = call()
+
+            statement_budget = STATEMENT_BUDGETS[endpoint]
+            row_budget = expected_rows(users)
+            ok = stats.statement_count <= statement_budget and stats.rows_fetched <= row_budget
+            print(
+                f"{'OK  ' if ok else 'NG  '} {endpoint} ({argument}): "
+                f"SQL {stats.statement_count}/{statement_budget}文, "
+                f"取得行数 {stats.rows_fetched}/{row_budget}行, ユーザー {len(users)}人"
+            )
+            if not ok:
+                failures.append(endpoint)
+                for statement, _ in stats.statements:
+                    print(f"    {statement.splitlines()[0][:120]}")
+
+    finally:
+        db.close()
+
+    if failures:
+        print(f"上限を超えたエンドポイント: {', '.join(failures)}")
+        return False
+    print("全てのエンドポイントが上限内です。")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if check_query_counts() else 1)
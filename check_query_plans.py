@@ -0,0 +1,65 @@
+import os
+import sys
+
+# 計測中は前回までの共有キャッシュを使わず、必ずDBに問い合わせる（プロセス内のキャッシュのみ使用）
+os.environ["CACHE_URL"] = "memory"
+
+from db_connection.connect_MySQL import SessionLocal, engine
+from db_crud.query_stats import record_queries
+from check_query_counts import build_cases
+import app
+
+def explain(conn, statement, parameters):
+    """
+    SQLの実行計画を取得し、フルスキャンしているテーブル名のリストを返す
+    MySQLはEXPLAINのtypeがALL、SQLite（ローカル確認用）はインデックスを使わないSCANをフルスキャンとみなす
+    """
+    if conn.dialect.name == "sqlite":
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+        return [
+            row.detail for row in rows
+            if row.detail.startswith("SCAN ") and " INDEX " not in row.detail
+        ]
+
+    rows = conn.exec_driver_sql(f"EXPLAIN {statement}", parameters).mappings().all()
+    return [row["table"] for row in rows if row["type"] == "ALL"]
+
+def check_query_plans():
+    """各エンドポイントで実行されるSELECT文をEXPLAINし、フルスキャンがないか確認"""
+    db = SessionLocal()
+    failures = []
+
+    try:
+        cases = build_cases(db, include_total=True)
+        cases.append(("/bookmarks/{user_id}/{bookmarked_user_id}/status", "1, 2",
+                      lambda: app._check_bookmark_status(1, 2, db)))
+
+        for endpoint, argument, call in cases:
+            db.expunge_all()
+            with record_queries(engine) as stats:
+                call()
+
+            with engine.connect() as conn:
+                for statement, parameters in stats.statements:
+                    if not statement.lstrip().upper().startswith("SELECT"):
+                        continue
+                    full_scans = explain(conn, statement, parameters)
+                    first_line = " ".join(statement.split())[:100]
+                    if full_scans:
+                        failures.append(endpoint)
+                        print(f"NG   {endpoint} ({argument}): フルスキャン {', '.join(full_scans)}")
+                        print(f"    {first_line}")
+                    else:
+                        print(f"OK   {endpoint} ({argument}): {first_line}")
+
+    finally:
+        db.close()
+
+    if failures:
+        print(f"フルスキャンしているエンドポイント: {', '.join(sorted(set(failures)))}")
+        return False
+    print("全てのクエリがインデックスを使用しています。")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if check_query_plans() else 1)
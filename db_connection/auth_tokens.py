@@ -0,0 +1,77 @@
+import os
+import uuid
+import logging
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from dotenv import load_dotenv
+from jose import jwt, JWTError
+
+# ロギング設定
+logger = logging.getLogger("auth")
+
+# 環境変数の読み込み
+base_path = Path(__file__).parents[1]  # backendディレクトリへのパス
+env_path = base_path / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# トークンの署名設定（HMAC-SHA256、署名の比較は定数時間で行われる）
+JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+# アクセストークン（分）・リフレッシュトークン（日）の有効期限
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+# trueにするとuser_idを受け取るAPIでアクセストークンを必須にする（フロントエンドの移行が終わるまではfalse）
+AUTH_REQUIRED = os.getenv("AUTH_REQUIRED", "false").lower() == "true"
+
+ACCESS = "access"
+REFRESH = "refresh"
+
+# 署名鍵は全ワーカー・再起動後も同じ値である必要があるため、プロセスごとの鍵は作らない
+TOKENS_ENABLED = bool(JWT_SECRET_KEY)
+if not TOKENS_ENABLED:
+    if AUTH_REQUIRED:
+        raise RuntimeError("AUTH_REQUIRED=true の場合はJWT_SECRET_KEYを設定してください")
+    logger.warning("JWT_SECRET_KEYが設定されていないため、トークンの発行・検証を行いません")
+
+def create_token(user_id, token_type, expires_delta):
+    """ユーザーIDと種別を含む署名付きトークンを作成（署名鍵が未設定の場合はRuntimeError）"""
+    if not TOKENS_ENABLED:
+        raise RuntimeError("JWT_SECRET_KEYが設定されていないため、トークンを発行できません")
+    now = datetime.now(timezone.utc)
+    claims = {
+        "sub": str(user_id),
+        "type": token_type,
+        "iat": now,
+        "exp": now + expires_delta,
+        "jti": uuid.uuid4().hex,
+    }
+    return jwt.encode(claims, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
+
+def create_token_pair(user_id):
+    """アクセストークンとリフレッシュトークンを作成（ログイン・リフレッシュ時のレスポンス用）"""
+    return {
+        "access_token": create_token(user_id, ACCESS, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)),
+        "refresh_token": create_token(user_id, REFRESH, timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+def verify_token(token, token_type=ACCESS):
+    """
+    トークンの署名・有効期限・種別を検証し、ユーザーIDを返す
+    DBやbcryptを使わないため、リクエストごとに検証しても負荷はほとんどない
+    不正なトークンの場合（署名鍵が未設定の場合を含む）はValueErrorを送出する
+    """
+    if not TOKENS_ENABLED:
+        raise ValueError("トークンの署名鍵が設定されていません")
+    try:
+        claims = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+    except JWTError as e:
+        raise ValueError(f"トークンが無効です: {e}") from e
+
+    if claims.get("type") != token_type:
+        raise ValueError("トークンの種別が正しくありません")
+    try:
+        return int(claims["sub"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError("トークンにユーザーIDが含まれていません") from e
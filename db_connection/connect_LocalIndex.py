@@ -0,0 +1,312 @@
+import os
+import json
+import threading
+import logging
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+import numpy as np
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# ロギング設定
+logger = logging.getLogger("local_index")
+
+# 環境変数の読み込み
+base_path = Path(__file__).parents[1]  # backendディレクトリへのパス
+env_path = base_path / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# ローカルインデックスの保存先と次元数
+LOCAL_INDEX_DIR = Path(os.getenv("LOCAL_INDEX_DIR", str(base_path / "local_index")))
+LOCAL_INDEX_DIMENSION = int(os.getenv("LOCAL_INDEX_DIMENSION", "1536"))  # OpenAIのデフォルト埋め込みサイズ
+
+# ローカルインデックスのシングルトンインスタンス
+_local_index = None
+_local_index_lock = threading.Lock()
+
+class LocalVectorIndex:
+    """
+    NumPyによるプロセス内の全件探索（flat）ベクトルインデックス
+    Pinecone Indexの upsert / delete / query / describe_index_stats と同じ形で呼び出せる
+
+    ファイル構成（複数のワーカー・load_pinecone_data.py から同じディレクトリを使える）
+      vectors.f32    : 正規化済みfloat32のベクトル（行番号順、メモリマップで読み込む）
+      metadata.jsonl : 1行目にヘッダー、以降は {id, row, metadata} の追記ログ（同じ行は後の記録が優先）
+      .lock          : 書き込みは排他ロック、他のプロセスの変更の読み込みは共有ロックを取る
+    追加は末尾に行を書き足し、更新は該当行だけを書き換える（ファイル全体は書き直さない）
+    他のプロセスの書き込みはログのサイズ・更新日時の変化で検知し、前回の続きから読み込む
+    fcntlのない環境（Windows）ではファイルロックを取らないため、書き込むプロセスは1つにすること
+    """
+
+    def __init__(self, directory, dimension=LOCAL_INDEX_DIMENSION):
+        self.directory = Path(directory)
+        self.dimension = dimension
+        self._row_bytes = dimension * np.dtype(np.float32).itemsize
+        self._vectors_path = self.directory / "vectors.f32"
+        self._log_path = self.directory / "metadata.jsonl"
+        self._legacy_meta_path = self.directory / "metadata.json"
+        self._lock_path = self.directory / ".lock"
+        self._lock = threading.RLock()
+        self._lock_file = None
+        self._reset()
+        self._migrate_legacy()
+        self._refresh()
+
+    def _reset(self):
+        self._ids = []
+        self._positions = {}
+        self._metadata = []
+        self._vectors = np.zeros((0, self.dimension), dtype=np.float32)
+        self._log_offset = 0  # 読み込み済みのログのバイト数
+        self._log_stat = None  # 読み込んだ時点のログの (inode, サイズ, 更新日時)
+
+    @contextmanager
+    def _file_lock(self, exclusive):
+        """プロセス間のロック（書き込みは排他、読み込みは共有）"""
+        if fcntl is None:
+            yield
+            return
+        if self._lock_file is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._lock_file = open(self._lock_path, "a+b")
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _stat_log(self):
+        try:
+            stat = os.stat(self._log_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def _refresh(self):
+        """他のプロセスの書き込みがあれば読み込む（ログのstatが変わっていなければ何もしない）"""
+        if self._stat_log() == self._log_stat:
+            return
+        with self._lock, self._file_lock(exclusive=False):
+            self._refresh_locked()
+
+    def _refresh_locked(self):
+        """ログの続きを読み込んで状態を差し替える（ロック内で呼ぶ）"""
+        log_stat = self._stat_log()
+        if log_stat == self._log_stat:
+            return
+        if log_stat is None:
+            self._reset()
+            return
+        # 作り直された（deleteで詰められた）場合は最初から読み込む
+        if self._log_stat is not None and (log_stat[0] != self._log_stat[0] or log_stat[1] < self._log_offset):
+            self._reset()
+
+        with open(self._log_path, "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read()
+        # 書き込み途中の行は次回に読む
+        complete = data[:data.rfind(b"\n") + 1]
+
+        ids = list(self._ids)
+        positions = dict(self._positions)
+        metadata = list(self._metadata)
+        for line in complete.splitlines():
+            record = json.loads(line)
+            if "dimension" in record:
+                if record["dimension"] != self.dimension:
+                    raise ValueError(
+                        f"ローカルインデックスの次元数が一致しません: {record['dimension']} != {self.dimension}"
+                    )
+                continue
+            row = record["row"]
+            if row == len(ids):
+                positions[record["id"]] = row
+                ids.append(record["id"])
+                metadata.append(record["metadata"])
+            else:
+                metadata[row] = record["metadata"]
+
+        if len(ids) != len(self._ids) or self._log_offset == 0:
+            self._vectors = self._map_vectors(len(ids))
+        self._ids, self._positions, self._metadata = ids, positions, metadata
+        self._log_offset += len(complete)
+        self._log_stat = log_stat if len(complete) == len(data) else None
+
+        if complete:
+            logger.info(f"ローカルインデックスを読み込みました: {len(ids)}件")
+
+    def _map_vectors(self, rows):
+        if rows == 0:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dimension))
+
+    def _write_header(self, f):
+        f.write((json.dumps({"dimension": self.dimension}) + "\n").encode("utf-8"))
+
+    @staticmethod
+    def _record_line(vector_id, row, metadata):
+        return (json.dumps({"id": vector_id, "row": row, "metadata": metadata}, ensure_ascii=False) + "\n").encode("utf-8")
+
+    def _migrate_legacy(self):
+        """以前の形式（metadata.json に全件を書き出す形式）をログ形式に変換する"""
+        if not self._legacy_meta_path.exists():
+            return
+        with self._lock, self._file_lock(exclusive=True):
+            if not self._legacy_meta_path.exists() or self._log_path.exists():
+                return
+            with open(self._legacy_meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("dimension") != self.dimension:
+                raise ValueError(
+                    f"ローカルインデックスの次元数が一致しません: {meta.get('dimension')} != {self.dimension}"
+                )
+            tmp_log = self._log_path.with_suffix(".tmp")
+            with open(tmp_log, "wb") as f:
+                self._write_header(f)
+                for row, (vector_id, metadata) in enumerate(zip(meta["ids"], meta["metadata"])):
+                    f.write(self._record_line(vector_id, row, metadata))
+            os.replace(tmp_log, self._log_path)
+            self._legacy_meta_path.unlink()
+            logger.info(f"ローカルインデックスを新しい形式に変換しました: {len(meta['ids'])}件")
+
+    def _normalize(self, values):
+        vector = np.asarray(values, dtype=np.float32)
+        if vector.shape != (self.dimension,):
+            raise ValueError(f"ベクトルの次元数が不正です: {vector.shape}")
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def upsert(self, vectors):
+        """
+        ベクトルを追加・更新（Pineconeと同じ {id, values, metadata} 形式）
+        バッチ全体を検証してから書き込むため、不正なベクトルが含まれていても既存のインデックスは変更されない
+        ベクトルを書き込んでからログに追記するため、読み込み側はログにある行だけを使う
+        """
+        staged = [
+            (vector["id"], self._normalize(vector["values"]), vector.get("metadata") or {})
+            for vector in vectors
+        ]
+
+        with self._lock, self._file_lock(exclusive=True):
+            # 他のプロセスの書き込みを反映してから行番号を決める
+            self._refresh_locked()
+            rows = len(self._ids)
+            ids = list(self._ids)
+            positions = dict(self._positions)
+            metadata = list(self._metadata)
+            updates = {}  # 既存の行番号 -> ベクトル
+            new_rows = []
+            records = []
+            for vector_id, values, vector_metadata in staged:
+                row = positions.get(vector_id)
+                if row is None:
+                    row = len(ids)
+                    positions[vector_id] = row
+                    ids.append(vector_id)
+                    metadata.append(vector_metadata)
+                    new_rows.append(values)
+                elif row >= rows:
+                    new_rows[row - rows] = values
+                    metadata[row] = vector_metadata
+                else:
+                    updates[row] = values
+                    metadata[row] = vector_metadata
+                records.append(self._record_line(vector_id, row, vector_metadata))
+
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self._vectors_path, "r+b" if self._vectors_path.exists() else "w+b") as f:
+                for row, values in updates.items():
+                    f.seek(row * self._row_bytes)
+                    f.write(values.tobytes())
+                if new_rows:
+                    f.seek(rows * self._row_bytes)
+                    f.write(np.stack(new_rows).astype(np.float32).tobytes())
+            with open(self._log_path, "ab") as f:
+                if f.tell() == 0:
+                    self._write_header(f)
+                f.write(b"".join(records))
+
+            # 自分の書き込みもログから読み込む（行番号・メタデータは上で決めた内容と同じになる）
+            self._refresh_locked()
+            return SimpleNamespace(upserted_count=len(staged))
+
+    def delete(self, ids):
+        """
+        IDを指定してベクトルを削除（存在しないIDは無視する）
+        残す行を詰めてファイルを作り直すため、他のプロセスは次の読み込みで最初から読み直す
+        """
+        ids_to_delete = set(ids)
+        with self._lock, self._file_lock(exclusive=True):
+            self._refresh_locked()
+            keep = [i for i, vector_id in enumerate(self._ids) if vector_id not in ids_to_delete]
+            if len(keep) == len(self._ids):
+                return {}
+
+            tmp_vectors = self._vectors_path.with_suffix(".tmp")
+            np.ascontiguousarray(self._vectors[keep], dtype=np.float32).tofile(tmp_vectors)
+            tmp_log = self._log_path.with_suffix(".tmp")
+            with open(tmp_log, "wb") as f:
+                self._write_header(f)
+                for row, i in enumerate(keep):
+                    f.write(self._record_line(self._ids[i], row, self._metadata[i]))
+
+            os.replace(tmp_vectors, self._vectors_path)
+            os.replace(tmp_log, self._log_path)
+            self._reset()
+            self._refresh_locked()
+        return {}
+
+    def query(self, vector, top_k=10, include_metadata=True):
+        """
+        コサイン類似度の上位top_k件を返す
+        書き込みはリスト・行列を置き換えるため、ロック内で取得した組は常に同じ状態を指す
+        """
+        self._refresh()
+        with self._lock:
+            ids = self._ids
+            metadata = self._metadata
+            matrix = self._vectors
+
+        if not ids or top_k <= 0:
+            return SimpleNamespace(matches=[])
+
+        scores = matrix @ self._normalize(vector)
+        k = min(top_k, len(ids))
+        if k < len(ids):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(ids))
+        ordered = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        matches = [
+            SimpleNamespace(
+                id=ids[i],
+                score=float(scores[i]),
+                metadata=metadata[i] if include_metadata else None
+            )
+            for i in ordered
+        ]
+        return SimpleNamespace(matches=matches)
+
+    def describe_index_stats(self):
+        """インデックスの統計情報を返す"""
+        self._refresh()
+        with self._lock:
+            return SimpleNamespace(total_vector_count=len(self._ids), dimension=self.dimension)
+
+def get_local_index():
+    """ローカルインデックスのシングルトンインスタンスを返す"""
+    global _local_index
+
+    if _local_index is None:
+        with _local_index_lock:
+            if _local_index is None:
+                _local_index = LocalVectorIndex(LOCAL_INDEX_DIR)
+                logger.info(f"ローカルインデックス '{LOCAL_INDEX_DIR}' に接続しました")
+
+    return _local_index
@@ -20,6 +20,13 @@ DB_HOST = os.getenv('DB_HOST')
 DB_PORT = os.getenv('DB_PORT')
 DB_NAME = os.getenv('DB_NAME')
 
+# コネクションプールの設定（DB処理用スレッドプールのサイズにも使用）
+# 1ワーカーあたり最大 pool_size + max_overflow 本の接続を開くため、
+# ワーカー数（WEB_CONCURRENCY）との積がMySQLのmax_connections以下になるように設定する
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+
 # SSL証明書のパス
 ssl_cert = str(base_path / 'DigiCertGlobalRootG2.crt.pem')
 
@@ -37,8 +44,8 @@ engine = create_engine(
     echo=False,  # SQLログを無効化（本番環境用）
     pool_pre_ping=True,
     pool_recycle=3600,
-    pool_size=10,  # 同時接続数を制限
-    max_overflow=20,  # 最大オーバーフロー接続数
+    pool_size=DB_POOL_SIZE,  # 同時接続数を制限
+    max_overflow=DB_MAX_OVERFLOW,  # 最大オーバーフロー接続数
     pool_timeout=30  # 接続タイムアウト
 )
 
@@ -56,7 +63,25 @@ def get_db():
     finally:
         db.close()
 
-# テーブル作成
-Base.metadata.create_all(engine)
+def check_max_connections(conn):
+    """
+    全ワーカーのコネクションプールの上限がMySQLのmax_connectionsを超えないか確認する（超える場合は警告のみ）
+    MySQL以外（動作確認用のSQLiteなど）では何もしない
+    """
+    if conn.dialect.name != "mysql":
+        return
+    row = conn.exec_driver_sql("SHOW VARIABLES LIKE 'max_connections'").first()
+    if row is None:
+        return
+    max_connections = int(row[1])
+    planned = WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    if planned > max_connections:
+        logger.warning(
+            f"コネクションプールの上限 {planned}本（ワーカー {WEB_CONCURRENCY} × "
+            f"(DB_POOL_SIZE {DB_POOL_SIZE} + DB_MAX_OVERFLOW {DB_MAX_OVERFLOW})）が"
+            f"MySQLのmax_connections {max_connections} を超えています"
+        )
+
+# テーブル作成はインポート時に行わない（python -m db_model.migrations で実行する）
 
 logger.info("データベース接続が初期化されました")
\ No newline at end of file
@@ -1,12 +1,16 @@
 import os
+import asyncio
 from dotenv import load_dotenv
 from functools import lru_cache
 from pathlib import Path
 from pinecone import Pinecone, ServerlessSpec
-from db_connection.embedding import get_text_embedding
+from db_connection.embedding import get_text_embedding, async_get_text_embedding_vector, normalize_search_query
+from db_connection.connect_LocalIndex import LOCAL_INDEX_DIR, get_local_index
 import logging
 import time
-from cachetools import TTLCache, cached
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from db_connection.shared_cache import get_shared_cache
+from db_connection.single_flight import SingleFlight, AsyncSingleFlight
 
 # ロギング設定
 logger = logging.getLogger("pinecone")
@@ -20,6 +24,20 @@ load_dotenv(dotenv_path=env_path)
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_ENVIRONMENT = os.getenv("PINECONE_ENVIRONMENT", "gcp-starter")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "skills-index")
+# インデックスのホスト（指定するとインデックス名からホストを調べる問い合わせを省略できる）
+PINECONE_INDEX_HOST = os.getenv("PINECONE_INDEX_HOST")
+
+# 一括登録時のバッチサイズと同時実行数
+UPSERT_BATCH_SIZE = int(os.getenv("PINECONE_UPSERT_BATCH_SIZE", "200"))
+UPSERT_MAX_WORKERS = int(os.getenv("PINECONE_UPSERT_MAX_WORKERS", "4"))
+# 一括削除時のバッチサイズ（Pineconeの1回の削除で指定できるIDは1000件まで）
+DELETE_BATCH_SIZE = 1000
+
+# ベクトル検索のバックエンド（pinecone / local）
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+
+# ベクトルの登録単位（skill: スキルごとに1件、ユーザーは検索時にPostSkillから展開 / user: (スキル, ユーザー) ごとに1件）
+VECTOR_INDEX_MODE = os.getenv("VECTOR_INDEX_MODE", "skill").lower()
 
 # 埋め込みモデル（OpenAI）を設定
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -29,41 +47,47 @@ OPENAI_MODEL = os.getenv("OPENAI_MODEL", "text-embedding-ada-002")
 _pinecone_client = None
 _pinecone_index = None
 
-# 検索結果をキャッシュするためのTTLCache (1時間有効)
-search_cache = TTLCache(maxsize=100, ttl=3600)
+# 検索結果は共有キャッシュに保存する (1時間有効、clear_search_cache()で全ワーカー分を無効化)
+SEARCH_CACHE_TTL = 3600
+SEARCH_CACHE_TAG = "search"
+# 検索結果はlimitによらずこの件数で取得してキャッシュし、リクエストごとに先頭から切り出す
+SEARCH_CACHE_TOP_K = int(os.getenv("SEARCH_CACHE_TOP_K", "50"))
+
+# 同じクエリの同時検索をまとめ、エンベディング生成とベクトル検索を1回にする
+_search_flight = SingleFlight()
+_async_search_flight = AsyncSingleFlight()
+
+def _get_control_client():
+    """Pineconeクライアント（インデックスの一覧・作成用）を返す"""
+    global _pinecone_client
+    if _pinecone_client is None:
+        if not PINECONE_API_KEY:
+            raise ValueError("PINECONE_API_KEYが設定されていません")
+        _pinecone_client = Pinecone(api_key=PINECONE_API_KEY)
+    return _pinecone_client
 
 @lru_cache
 def get_pinecone_client():
-    """Pineconeクライアントのシングルトンインスタンスを返す"""
-    global _pinecone_client, _pinecone_index
+    """
+    Pineconeインデックスのシングルトンインスタンスを返す
+    インデックスの存在確認・作成は行わない（セットアップ時に create_pinecone_index() で作成する）
+    """
+    global _pinecone_index
+    
+    # ローカルインデックスを使用する場合はPineconeに接続しない
+    if VECTOR_BACKEND == "local":
+        return get_local_index()
     
     if _pinecone_index is not None:
         return _pinecone_index
     
-    if not PINECONE_API_KEY:
-        raise ValueError("PINECONE_API_KEYが設定されていません")
-    
     try:
         # Pineconeクライアントの初期化（新APIバージョン）
-        _pinecone_client = Pinecone(api_key=PINECONE_API_KEY)
-        
-        # インデックスの存在確認
-        index_list = [index.name for index in _pinecone_client.list_indexes()]
-        
-        # インデックスが存在しない場合、作成
-        if PINECONE_INDEX_NAME not in index_list:
-            _pinecone_client.create_index(
-                name=PINECONE_INDEX_NAME,
-                dimension=1536,  # OpenAIのデフォルト埋め込みサイズ
-                metric="cosine",  # コサイン類似度を使用
-                spec=ServerlessSpec(
-                    cloud="aws",
-                    region="us-east-1"
-                )
-            )
-            logger.info(f"Pineconeインデックス '{PINECONE_INDEX_NAME}' を作成しました")
-        
-        _pinecone_index = _pinecone_client.Index(PINECONE_INDEX_NAME)
+        client = _get_control_client()
+        if PINECONE_INDEX_HOST:
+            _pinecone_index = client.Index(host=PINECONE_INDEX_HOST)
+        else:
+            _pinecone_index = client.Index(PINECONE_INDEX_NAME)
         logger.info(f"Pineconeインデックス '{PINECONE_INDEX_NAME}' に接続しました")
         
         return _pinecone_index
@@ -74,42 +98,85 @@ def get_pinecone_client():
         traceback.print_exc()
         raise
 
+def ping_vector_index():
+    """
+    ベクトル検索のバックエンドに実際に問い合わせ、登録件数を返す（準備完了確認用）
+    Pineconeは describe_index_stats、ローカルインデックスは保存先の確認と読み込みを行う
+    """
+    if VECTOR_BACKEND == "local":
+        # 保存先がなければ（マウントされていないなど）エラーにする
+        if not LOCAL_INDEX_DIR.is_dir():
+            raise FileNotFoundError(f"ローカルインデックスの保存先がありません: {LOCAL_INDEX_DIR}")
+    return get_pinecone_client().describe_index_stats().total_vector_count
+
+def create_pinecone_index():
+    """Pineconeインデックスが存在しない場合に作成する（load_pinecone_data.pyなどのセットアップ用）"""
+    if VECTOR_BACKEND == "local":
+        return False
+
+    client = _get_control_client()
+    
+    # インデックスの存在確認
+    index_list = [index.name for index in client.list_indexes()]
+    if PINECONE_INDEX_NAME in index_list:
+        return False
+    
+    # インデックスが存在しない場合、作成
+    client.create_index(
+        name=PINECONE_INDEX_NAME,
+        dimension=1536,  # OpenAIのデフォルト埋め込みサイズ
+        metric="cosine",  # コサイン類似度を使用
+        spec=ServerlessSpec(
+            cloud="aws",
+            region="us-east-1"
+        )
+    )
+    logger.info(f"Pineconeインデックス '{PINECONE_INDEX_NAME}' を作成しました")
+    return True
+
+def user_vector_id(skill_id, user_id):
+    """(スキル, ユーザー) 単位のベクトルID"""
+    return f"skill_{skill_id}_user_{user_id}"
+
+def build_skill_vector(skill_id, skill_name, embedding, user_id=None, user_name=None):
+    """スキル情報からPineconeに登録するベクトルを作成"""
+    # メタデータを作成
+    metadata = {
+        "skill_id": skill_id,
+        "skill_name": skill_name,
+    }
+    
+    # ユーザー情報がある場合は追加（スキル単位のインデックスではユーザーを登録しない）
+    if VECTOR_INDEX_MODE == "user" and user_id is not None and user_name is not None:
+        metadata["user_id"] = user_id
+        metadata["user_name"] = user_name
+        vector_id = user_vector_id(skill_id, user_id)
+    else:
+        vector_id = f"skill_{skill_id}"
+    
+    return {
+        "id": vector_id,
+        "values": embedding,
+        "metadata": metadata
+    }
+
 def add_skill_to_pinecone(skill_id, skill_name, user_id=None, user_name=None):
     """スキル情報をPineconeに追加"""
     try:
         index = get_pinecone_client()
         
-        # メタデータを作成
-        metadata = {
-            "skill_id": skill_id,
-            "skill_name": skill_name,
-        }
-        
-        # ユーザー情報がある場合は追加
-        if user_id is not None and user_name is not None:
-            metadata["user_id"] = user_id
-            metadata["user_name"] = user_name
-            vector_id = f"skill_{skill_id}_user_{user_id}"
-        else:
-            vector_id = f"skill_{skill_id}"
-        
         # OpenAIでテキストをベクトル化
         embedding = get_text_embedding(skill_name)
         
         # Pineconeにベクトルを追加（新APIバージョン）
         index.upsert(
-            vectors=[{
-                "id": vector_id,
-                "values": embedding,
-                "metadata": metadata
-            }]
+            vectors=[build_skill_vector(skill_id, skill_name, embedding, user_id, user_name)]
         )
         
         logger.info(f"スキル '{skill_name}' (ID: {skill_id}) をPineconeに追加しました。")
         
         # キャッシュを更新
-        if hasattr(search_cache, 'clear'):
-            search_cache.clear()
+        clear_search_cache()
             
         return True
     except Exception as e:
@@ -118,42 +185,207 @@ def add_skill_to_pinecone(skill_id, skill_name, user_id=None, user_name=None):
         traceback.print_exc()
         return False
 
-# クエリと制限数をキーとしてキャッシュ
-@cached(cache=search_cache)
+def upsert_skill_vectors(vectors, batch_size=UPSERT_BATCH_SIZE, max_workers=UPSERT_MAX_WORKERS):
+    """
+    ベクトルをbatch_size件ずつPineconeに一括登録する
+    同時に実行するupsertはmax_workers件までに制限する
+    検索キャッシュは更新しないため、呼び出し側で最後にclear_search_cache()を呼ぶこと
+    """
+    index = get_pinecone_client()
+    upserted = 0
+
+    def upsert_batch(batch):
+        index.upsert(vectors=batch)
+        return len(batch)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = set()
+        batch = []
+        for vector in vectors:
+            batch.append(vector)
+            if len(batch) < batch_size:
+                continue
+
+            # 実行中のupsertが上限に達している場合は完了を待つ
+            if len(in_flight) >= max_workers:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                upserted += sum(future.result() for future in done)
+            in_flight.add(executor.submit(upsert_batch, batch))
+            batch = []
+
+        if batch:
+            in_flight.add(executor.submit(upsert_batch, batch))
+        upserted += sum(future.result() for future in in_flight)
+
+    logger.info(f"{upserted}件のベクトルをPineconeに登録しました。")
+    return upserted
+
+def delete_vectors(ids, batch_size=DELETE_BATCH_SIZE):
+    """
+    IDを指定してベクトルをbatch_size件ずつ削除し、削除を指示した件数を返す（存在しないIDは無視される）
+    検索キャッシュは更新しないため、呼び出し側で最後にclear_search_cache()を呼ぶこと
+    """
+    index = get_pinecone_client()
+    requested = 0
+    batch = []
+    for vector_id in ids:
+        batch.append(vector_id)
+        if len(batch) >= batch_size:
+            index.delete(ids=batch)
+            requested += len(batch)
+            batch = []
+    if batch:
+        index.delete(ids=batch)
+        requested += len(batch)
+
+    logger.info(f"{requested}件のベクトルの削除をPineconeに指示しました。")
+    return requested
+
+def search_top_k(limit):
+    """キャッシュする検索件数（SEARCH_CACHE_TOP_Kを超えるlimitの場合のみlimit件）"""
+    return max(limit, SEARCH_CACHE_TOP_K)
+
+def search_cache_key(normalized_query, top_k):
+    return ("search", VECTOR_BACKEND, VECTOR_INDEX_MODE, normalized_query, top_k)
+
+def clear_search_cache():
+    """検索結果のキャッシュをクリア（タグのバージョンを上げて全ワーカーのキャッシュを無効化）"""
+    get_shared_cache().invalidate([SEARCH_CACHE_TAG])
+
+def format_matches(results):
+    """
+    Pineconeの検索結果を辞書のリストに変換
+    スキル単位のインデックスでは、以前の形式で登録されたユーザーごとのベクトルもスキル1件にまとめる
+    """
+    formatted_results = []
+    seen_skill_ids = set()
+    for match in results.matches:
+        skill_id = match.metadata.get("skill_id")
+        user_id = match.metadata.get("user_id")
+        user_name = match.metadata.get("user_name")
+        if VECTOR_INDEX_MODE == "skill":
+            if skill_id in seen_skill_ids:
+                continue
+            seen_skill_ids.add(skill_id)
+            user_id = user_name = None
+
+        formatted_results.append({
+            "skill_id": skill_id,
+            "skill_name": match.metadata.get("skill_name"),
+            "user_id": user_id,
+            "user_name": user_name,
+            "text": match.metadata.get("skill_name", ""),
+            "score": match.score
+        })
+    return formatted_results
+
+def query_similar_skills(query, top_k=SEARCH_CACHE_TOP_K):
+    """Pineconeを使用して類似したスキルを検索（キャッシュなし、エラーは呼び出し側に送出）"""
+    start_time = time.time()
+    index = get_pinecone_client()
+
+    # クエリテキストをベクトル化
+    query_embedding = get_text_embedding(query)
+
+    # 類似検索を実行（新APIバージョン）
+    results = index.query(
+        vector=query_embedding,
+        top_k=top_k,
+        include_metadata=True
+    )
+
+    # 結果をフォーマット（新APIバージョン）
+    formatted_results = format_matches(results)
+
+    end_time = time.time()
+    logger.info(f"検索クエリ '{query}' の実行時間: {end_time - start_time:.2f}秒")
+    return formatted_results
+
 def search_similar_skills(query, limit=5):
-    """Pineconeを使用して類似したスキルを検索"""
+    """
+    Pineconeを使用して類似したスキルを検索
+    正規化したクエリをキーに、SEARCH_CACHE_TOP_K件の結果をキャッシュしてlimit件を返す
+    """
+    normalized = normalize_search_query(query)
+    if not normalized:
+        return []
+    top_k = search_top_k(limit)
+    cache = get_shared_cache()
+    key = search_cache_key(normalized, top_k)
+    try:
+        results = cache.get(key)
+        if results is None:
+            # キャッシュにない場合、同じクエリを実行中のスレッドがあればその結果を待つ
+            results = _search_flight.do(key, lambda: cache.get_or_set(
+                key,
+                lambda: query_similar_skills(normalized, top_k),
+                tags=[SEARCH_CACHE_TAG],
+                ttl=SEARCH_CACHE_TTL
+            ))
+        return results[:limit]
+    except Exception as e:
+        logger.error(f"検索エラー: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return []
+
+async def async_get_pinecone_client():
+    """get_pinecone_clientの非同期版（初回接続時のみスレッドで実行）"""
+    if VECTOR_BACKEND == "local":
+        return get_local_index()
+    if _pinecone_index is not None:
+        return _pinecone_index
+    return await asyncio.to_thread(get_pinecone_client)
+
+async def async_query_similar_skills(query, top_k, key):
+    """
+    query_similar_skillsの非同期版（結果は共有キャッシュに保存、エラーは呼び出し側に送出）
+    エンベディングは非同期OpenAIクライアントで生成する
+    """
+    cache = get_shared_cache()
+    # 検索前のタグのバージョンで保存する（検索中にclear_search_cache()されたら保存した結果は無効になる）
+    versions = await asyncio.to_thread(cache.get_versions, [SEARCH_CACHE_TAG])
+
     start_time = time.time()
+    index = await async_get_pinecone_client()
+
+    # クエリテキストをベクトル化
+    query_embedding = (await async_get_text_embedding_vector(query)).tolist()
+
+    # 類似検索を実行（ローカルインデックスも他のプロセスの書き込みの読み込み・ファイルロックがあるためスレッドで実行）
+    results = await asyncio.to_thread(
+        index.query, vector=query_embedding, top_k=top_k, include_metadata=True
+    )
+
+    formatted_results = format_matches(results)
+    if versions is not None:
+        await asyncio.to_thread(cache.set, key, formatted_results, versions, SEARCH_CACHE_TTL)
+
+    end_time = time.time()
+    logger.info(f"検索クエリ '{query}' の実行時間: {end_time - start_time:.2f}秒")
+    return formatted_results
+
+async def async_search_similar_skills(query, limit=5):
+    """
+    search_similar_skillsの非同期版
+    キャッシュは同期版と共有し、同じクエリの同時検索は1回の検索にまとめる
+    """
+    normalized = normalize_search_query(query)
+    if not normalized:
+        return []
+    top_k = search_top_k(limit)
+
+    key = search_cache_key(normalized, top_k)
     try:
-        index = get_pinecone_client()
-        
-        # クエリテキストをベクトル化
-        query_embedding = get_text_embedding(query)
-        
-        # 類似検索を実行（新APIバージョン）
-        results = index.query(
-            vector=query_embedding,
-            top_k=limit,
-            include_metadata=True
-        )
-        
-        # 結果をフォーマット（新APIバージョン）
-        formatted_results = []
-        for match in results.matches:
-            formatted_results.append({
-                "skill_id": match.metadata.get("skill_id"),
-                "skill_name": match.metadata.get("skill_name"),
-                "user_id": match.metadata.get("user_id"),
-                "user_name": match.metadata.get("user_name"),
-                "text": match.metadata.get("skill_name", ""),
-                "score": match.score
-            })
-        
-        end_time = time.time()
-        logger.info(f"検索クエリ '{query}' の実行時間: {end_time - start_time:.2f}秒")
-        return formatted_results
-    
+        results = await asyncio.to_thread(get_shared_cache().get, key)
+        if results is None:
+            results = await _async_search_flight.do(
+                key, lambda: async_query_similar_skills(normalized, top_k, key)
+            )
+        return results[:limit]
+
     except Exception as e:
         logger.error(f"検索エラー: {str(e)}")
         import traceback
         traceback.print_exc()
-        return [] 
\ No newline at end of file
+        return []
@@ -1,6 +1,13 @@
 import os
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from pathlib import Path
 import numpy as np
 import openai
+from cachetools import LRUCache
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,8 +15,217 @@ load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL")
 
+# エンベディングキャッシュの設定
+base_path = Path(__file__).parents[1]  # backendディレクトリへのパス
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", str(base_path / ".cache" / "embeddings.sqlite3"))  # 空文字でディスクキャッシュ無効
+EMBEDDING_MEMORY_CACHE_SIZE = int(os.getenv("EMBEDDING_MEMORY_CACHE_SIZE", "4096"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))  # 1リクエストあたりのテキスト数
+
+# プロセス内のLRUキャッシュ（キー: (モデル名, テキストハッシュ)）
+_memory_cache = LRUCache(maxsize=EMBEDDING_MEMORY_CACHE_SIZE)
+_memory_cache_lock = threading.Lock()
+
+# 非同期OpenAIクライアントのシングルトンインスタンス
+_async_openai_client = None
+
+class EmbeddingStore:
+    """
+    SQLiteによるエンベディングのディスクキャッシュ
+    ベクトルはfloat32のバイト列として (モデル名, テキストハッシュ) をキーに保存する
+    """
+
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    dimension INTEGER NOT NULL,
+                    vector BLOB NOT NULL,
+                    PRIMARY KEY (model, text_hash)
+                )
+            """)
+            self._conn.commit()
+
+    def get_many(self, model, text_hashes):
+        """複数のハッシュに対応するベクトルを {ハッシュ: ベクトル} で返す"""
+        vectors = {}
+        text_hashes = list(text_hashes)
+        for start in range(0, len(text_hashes), 500):
+            chunk = text_hashes[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT text_hash, dimension, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    (model, *chunk)
+                ).fetchall()
+            for text_hash, dimension, blob in rows:
+                vectors[text_hash] = np.frombuffer(blob, dtype=np.float32, count=dimension)
+        return vectors
+
+    def put_many(self, model, items):
+        """(ハッシュ, ベクトル) のリストをまとめて保存する"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, dimension, vector) VALUES (?, ?, ?, ?)",
+                [(model, text_hash, len(vector), vector.tobytes()) for text_hash, vector in items]
+            )
+            self._conn.commit()
+
+# ディスクキャッシュのシングルトンインスタンス
+_embedding_store = None
+_embedding_store_lock = threading.Lock()
+
+def get_embedding_store():
+    """ディスクキャッシュのシングルトンインスタンスを返す（無効な場合はNone）"""
+    global _embedding_store
+
+    if not EMBEDDING_CACHE_PATH:
+        return None
+
+    if _embedding_store is None:
+        with _embedding_store_lock:
+            if _embedding_store is None:
+                _embedding_store = EmbeddingStore(EMBEDDING_CACHE_PATH)
+
+    return _embedding_store
+
+def normalize_embedding_text(text):
+    """キャッシュキーと埋め込み対象を揃えるためにテキストを正規化する"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def normalize_search_query(query):
+    """
+    検索クエリを正規化する（NFKCで全角・半角を統一し、大文字小文字と空白の違いを無視する）
+    "Python"・"python "・"ｐｙｔｈｏｎ" は同じクエリとして扱われ、エンベディングと検索結果のキャッシュを共有する
+    """
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+def _text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _lookup_memory_cache(keys):
+    """プロセス内キャッシュから {テキスト: ベクトル} を取得する"""
+    vectors = {}
+    with _memory_cache_lock:
+        for text, key in keys.items():
+            vector = _memory_cache.get(key)
+            if vector is not None:
+                vectors[text] = vector
+    return vectors
+
+def _lookup_disk_cache(keys, texts):
+    """ディスクキャッシュから {テキスト: ベクトル} を取得する"""
+    store = get_embedding_store()
+    if store is None or not texts:
+        return {}
+    model = next(iter(keys.values()))[0]
+    pending = {keys[text][1]: text for text in texts}
+    return {
+        pending[text_hash]: vector
+        for text_hash, vector in store.get_many(model, pending).items()
+    }
+
+def _to_vectors(texts, embeddings):
+    """APIのレスポンスを読み取り専用のfloat32配列に変換する"""
+    created = {}
+    for text, embedding in zip(texts, embeddings):
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector.setflags(write=False)
+        created[text] = vector
+    return created
+
+def _save_disk_cache(keys, created):
+    store = get_embedding_store()
+    if store is not None and created:
+        model = next(iter(keys.values()))[0]
+        store.put_many(model, [(keys[text][1], vector) for text, vector in created.items()])
+
+def _save_memory_cache(keys, fetched):
+    with _memory_cache_lock:
+        for text, vector in fetched.items():
+            _memory_cache[keys[text]] = vector
+
+def _cache_keys(normalized):
+    model = OPENAI_MODEL or ""
+    return {text: (model, _text_hash(text)) for text in normalized}
+
+def get_text_embedding_vectors(texts):
+    """
+    複数テキストのエンベディングをまとめて生成する（float32配列のリスト、キャッシュ利用）
+    同じテキストは1回だけ扱い、キャッシュにないものだけを
+    EMBEDDING_BATCH_SIZE件ずつのバッチでOpenAIに問い合わせる
+    """
+    normalized = [normalize_embedding_text(text) for text in texts]
+    keys = _cache_keys(normalized)
+
+    # プロセス内キャッシュ → ディスクキャッシュの順に確認
+    vectors = _lookup_memory_cache(keys)
+    fetched = _lookup_disk_cache(keys, [text for text in keys if text not in vectors])
+
+    # キャッシュにないテキストのみOpenAIに問い合わせる
+    missing = [text for text in keys if text not in vectors and text not in fetched]
+    for start in range(0, len(missing), EMBEDDING_BATCH_SIZE):
+        batch = missing[start:start + EMBEDDING_BATCH_SIZE]
+        created = _to_vectors(batch, _request_embeddings(batch))
+        _save_disk_cache(keys, created)
+        fetched.update(created)
+
+    if fetched:
+        _save_memory_cache(keys, fetched)
+        vectors.update(fetched)
+
+    return [vectors[text] for text in normalized]
+
+async def async_get_text_embedding_vectors(texts):
+    """
+    get_text_embedding_vectorsの非同期版
+    OpenAIへの問い合わせは非同期クライアントで行い、ディスクキャッシュの読み書きは
+    スレッドで実行するため、イベントループをブロックしない
+    """
+    normalized = [normalize_embedding_text(text) for text in texts]
+    keys = _cache_keys(normalized)
+
+    # プロセス内キャッシュで全て揃う場合はスレッドに切り替えない
+    vectors = _lookup_memory_cache(keys)
+    pending = [text for text in keys if text not in vectors]
+    if not pending:
+        return [vectors[text] for text in normalized]
+
+    fetched = await asyncio.to_thread(_lookup_disk_cache, keys, pending)
+
+    # キャッシュにないテキストのみOpenAIに問い合わせる
+    missing = [text for text in pending if text not in fetched]
+    for start in range(0, len(missing), EMBEDDING_BATCH_SIZE):
+        batch = missing[start:start + EMBEDDING_BATCH_SIZE]
+        created = _to_vectors(batch, await _async_request_embeddings(batch))
+        await asyncio.to_thread(_save_disk_cache, keys, created)
+        fetched.update(created)
+
+    if fetched:
+        _save_memory_cache(keys, fetched)
+        vectors.update(fetched)
+
+    return [vectors[text] for text in normalized]
+
+def get_text_embedding_vector(text):
+    """テキストからエンベディングを生成する（float32配列、キャッシュ利用）"""
+    return get_text_embedding_vectors([text])[0]
+
+async def async_get_text_embedding_vector(text):
+    """テキストからエンベディングを非同期で生成する（float32配列、キャッシュ利用）"""
+    return (await async_get_text_embedding_vectors([text]))[0]
+
 def get_text_embedding(text):
     """テキストからエンベディングを生成する"""
+    return get_text_embedding_vector(text).tolist()
+
+def _request_embeddings(texts):
+    """OpenAI APIで複数テキストのエンベディングをまとめて生成する"""
 
     if not openai.api_key:
         raise ValueError("OpenAI APIキーが設定されていません。")
@@ -17,18 +233,46 @@ def get_text_embedding(text):
     try:
         response = openai.embeddings.create(
             model=OPENAI_MODEL,
-            input=text
+            input=texts
         )
 
-        # レスポンスからエンベディングを取得
-        embedding = response.data[0].embedding
+        # レスポンスからエンベディングを入力順に取得
+        embeddings = [data.embedding for data in sorted(response.data, key=lambda data: data.index)]
 
-        return embedding
+        return embeddings
     
     except Exception as e:
         print(f"エンベディング生成リクエストエラー: {e}")
         raise
 
+def get_async_openai_client():
+    """非同期OpenAIクライアントのシングルトンインスタンスを返す"""
+    global _async_openai_client
+
+    if _async_openai_client is None:
+        _async_openai_client = openai.AsyncOpenAI(api_key=openai.api_key)
+
+    return _async_openai_client
+
+async def _async_request_embeddings(texts):
+    """非同期OpenAIクライアントで複数テキストのエンベディングをまとめて生成する"""
+
+    if not openai.api_key:
+        raise ValueError("OpenAI APIキーが設定されていません。")
+
+    try:
+        response = await get_async_openai_client().embeddings.create(
+            model=OPENAI_MODEL,
+            input=texts
+        )
+
+        # レスポンスからエンベディングを入力順に取得
+        return [data.embedding for data in sorted(response.data, key=lambda data: data.index)]
+
+    except Exception as e:
+        print(f"エンベディング生成リクエストエラー: {e}")
+        raise
+
 def cosine_similarity(embedding1, embedding2):
     """2つのエンベディング間のコサイン類似度を計算する"""
     embedding1 = np.array(embedding1)
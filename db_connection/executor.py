@@ -0,0 +1,37 @@
+import os
+import asyncio
+import contextvars
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from db_connection.connect_MySQL import DB_POOL_SIZE, DB_MAX_OVERFLOW
+
+# ロギング設定
+logger = logging.getLogger("executor")
+
+# 同期DB処理用のスレッドプール
+# コネクションプールの上限 (pool_size + max_overflow) と同じ数に制限し、
+# 接続待ちのスレッドが溜まらないようにする
+DB_EXECUTOR_WORKERS = DB_POOL_SIZE + DB_MAX_OVERFLOW
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+
+# bcryptなどCPU負荷の高い処理用のスレッドプール（DB処理の枠を消費しないよう分離）
+CPU_EXECUTOR_WORKERS = int(os.getenv("CPU_EXECUTOR_WORKERS", str(os.cpu_count() or 1)))
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_EXECUTOR_WORKERS, thread_name_prefix="cpu")
+
+logger.info(f"スレッドプールを初期化しました: DB={DB_EXECUTOR_WORKERS}, CPU={CPU_EXECUTOR_WORKERS}")
+
+async def _run_in_executor(executor, func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # リクエストIDなどのコンテキスト変数をワーカースレッドに引き継ぐ
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await loop.run_in_executor(executor, call)
+
+async def run_db(func, *args, **kwargs):
+    """同期DB処理をDB用スレッドプールで実行し、イベントループをブロックしない"""
+    return await _run_in_executor(db_executor, func, *args, **kwargs)
+
+async def run_cpu(func, *args, **kwargs):
+    """CPU負荷の高い処理をCPU用スレッドプールで実行し、イベントループをブロックしない"""
+    return await _run_in_executor(cpu_executor, func, *args, **kwargs)
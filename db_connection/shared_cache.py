@@ -0,0 +1,251 @@
+import os
+import time
+import pickle
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+from cachetools import TTLCache
+
+# ロギング設定
+logger = logging.getLogger("shared_cache")
+
+# 環境変数の読み込み
+base_path = Path(__file__).parents[1]  # backendディレクトリへのパス
+env_path = base_path / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# キャッシュの接続先
+#   sqlite:///パス : 同じホストのワーカー間で共有するSQLiteファイル（既定）
+#   redis://...    : 複数ホストで共有するRedis互換サーバー
+#   memory         : プロセス内のみ（ワーカー間で共有されない）
+CACHE_URL = os.getenv("CACHE_URL", f"sqlite:///{base_path / '.cache' / 'response_cache.sqlite3'}")
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "3600"))
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "chotto:v1")
+
+class MemoryCacheBackend:
+    """プロセス内のキャッシュ（単一ワーカー・開発用）"""
+
+    def __init__(self, maxsize=4096):
+        self._lock = threading.Lock()
+        self._entries = TTLCache(maxsize=maxsize, ttl=CACHE_TTL_SECONDS)
+        self._versions = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry[0] < time.time():
+            return None
+        return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+
+    def get_versions(self, tags):
+        with self._lock:
+            return {tag: self._versions.get(tag, 0) for tag in tags}
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+class SQLiteCacheBackend:
+    """SQLiteファイルによるキャッシュ（同じホストのワーカー間で共有）"""
+
+    # 期限切れエントリを削除する頻度（set何回ごとか）
+    PURGE_INTERVAL = 1000
+
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._sets = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_tags (
+                    tag TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL
+                )
+            """)
+            self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM cache_entries WHERE key = ? AND expires_at >= ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl)
+            )
+            self._sets += 1
+            if self._sets % self.PURGE_INTERVAL == 0:
+                self._conn.execute("DELETE FROM cache_entries WHERE expires_at < ?", (time.time(),))
+            self._conn.commit()
+
+    def get_versions(self, tags):
+        tags = list(tags)
+        versions = dict.fromkeys(tags, 0)
+        for start in range(0, len(tags), 500):
+            chunk = tags[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT tag, version FROM cache_tags WHERE tag IN ({placeholders})", chunk
+                ).fetchall()
+            versions.update(rows)
+        return versions
+
+    def bump(self, tags):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO cache_tags (tag, version) VALUES (?, 1) "
+                "ON CONFLICT(tag) DO UPDATE SET version = version + 1",
+                [(tag,) for tag in tags]
+            )
+            self._conn.commit()
+
+class RedisCacheBackend:
+    """Redis互換サーバーによるキャッシュ（複数ホストで共有）"""
+
+    def __init__(self, url):
+        import redis  # Redisを使う場合のみ必要
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self._client.get(key)
+
+    def set(self, key, value, ttl):
+        self._client.set(key, value, ex=ttl)
+
+    def get_versions(self, tags):
+        tags = list(tags)
+        if not tags:
+            return {}
+        values = self._client.mget([f"tag:{tag}" for tag in tags])
+        return {tag: int(value) if value is not None else 0 for tag, value in zip(tags, values)}
+
+    def bump(self, tags):
+        pipeline = self._client.pipeline(transaction=False)
+        for tag in tags:
+            pipeline.incr(f"tag:{tag}")
+        pipeline.execute()
+
+def create_backend(url):
+    """CACHE_URLからバックエンドを作成"""
+    if url == "memory":
+        return MemoryCacheBackend()
+    if url.startswith("sqlite:///"):
+        return SQLiteCacheBackend(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCacheBackend(url)
+    raise ValueError(f"CACHE_URLの形式が正しくありません: {url}")
+
+class SharedCache:
+    """
+    ワーカー間で共有するキャッシュ
+    各エントリは作成時のタグのバージョンと一緒に保存し、読み込み時にタグの現在のバージョンと
+    一致しない場合は無効とみなす。データ変更時はinvalidate()でタグのバージョンを上げるだけで、
+    そのタグを持つエントリがどのワーカーからも一斉に無効になる
+    """
+
+    def __init__(self, backend, prefix=CACHE_KEY_PREFIX, ttl=CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _key(self, key):
+        if isinstance(key, tuple):
+            key = ":".join(str(part) for part in key)
+        return f"{self.prefix}:{key}"
+
+    def get(self, key):
+        """有効なエントリの値を返す（なければNone）"""
+        try:
+            blob = self.backend.get(self._key(key))
+            if blob is None:
+                return None
+            versions, value = pickle.loads(blob)
+            if versions and self.backend.get_versions(versions.keys()) != versions:
+                return None
+            return value
+        except Exception as e:
+            logger.warning(f"キャッシュの読み込みに失敗しました: {e}")
+            return None
+
+    def set(self, key, value, versions, ttl=None):
+        """get_versions() で取得したタグのバージョンと一緒に値を保存"""
+        try:
+            blob = pickle.dumps((versions, value), protocol=pickle.HIGHEST_PROTOCOL)
+            self.backend.set(self._key(key), blob, ttl or self.ttl)
+        except Exception as e:
+            logger.warning(f"キャッシュの保存に失敗しました: {e}")
+
+    def get_versions(self, tags):
+        try:
+            return self.backend.get_versions(set(tags))
+        except Exception as e:
+            logger.warning(f"タグのバージョン取得に失敗しました: {e}")
+            return None
+
+    def get_or_set(self, key, load, tags=(), result_tags=None, ttl=None):
+        """
+        キャッシュがあれば返し、なければload()の結果を保存して返す
+        tags: 読み込み前に決まるタグ / result_tags: 結果から決まるタグを返す関数（一覧に含まれるユーザーなど）
+        読み込み中にtagsが無効化された場合は古い結果になりうるため保存しない
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        before = self.get_versions(tags)
+        value = load()
+        if before is None:
+            return value
+
+        all_tags = set(tags) | set(result_tags(value) if result_tags else ())
+        versions = self.get_versions(all_tags)
+        if versions is None or any(versions[tag] != version for tag, version in before.items()):
+            return value
+
+        self.set(key, value, versions, ttl)
+        return value
+
+    def invalidate(self, tags):
+        """タグのバージョンを上げ、そのタグを持つエントリをすべて無効にする"""
+        tags = set(tags)
+        if not tags:
+            return
+        try:
+            self.backend.bump(tags)
+            logger.info(f"キャッシュを無効化しました: {', '.join(sorted(tags))}")
+        except Exception as e:
+            logger.error(f"キャッシュの無効化に失敗しました: {e}")
+
+# 共有キャッシュのシングルトンインスタンス
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+def get_shared_cache():
+    """共有キャッシュのシングルトンインスタンスを返す"""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = SharedCache(create_backend(CACHE_URL))
+    return _shared_cache
@@ -0,0 +1,55 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+class SingleFlight:
+    """
+    同じキーの処理が実行中であれば新たに実行せず、その結果を待って共有する（スレッド用）
+    キャッシュが切れた直後に同じクエリが集中しても、外部APIへの問い合わせは1回になる
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        # 実行中の処理があればその結果（または例外）を待つ
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+class AsyncSingleFlight:
+    """SingleFlightの非同期版（同じイベントループ内の同じキーのコルーチンを1つにまとめる）"""
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, coro_fn):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # 待っている1つのリクエストがキャンセルされても、共有している処理は止めない
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
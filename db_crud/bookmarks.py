@@ -0,0 +1,57 @@
+from sqlalchemy import Integer, delete, insert, literal, select
+from sqlalchemy.orm import Session
+from db_model.tables import Bookmark, User as DBUser
+
+# 一括更新APIで1回に指定できる件数（追加・削除それぞれ）
+BOOKMARK_BATCH_LIMIT = 1000
+
+def fetch_bookmarked_user_ids(db: Session, user_id, target_user_ids):
+    """target_user_idsのうち、user_idがブックマークしているユーザーIDの集合を1回のIN (...)クエリで取得"""
+    target_user_ids = set(target_user_ids)
+    if not target_user_ids:
+        return set()
+    return set(db.execute(
+        select(Bookmark.bookmarked_user_id)
+        .where(Bookmark.bookmarking_user_id == user_id)
+        .where(Bookmark.bookmarked_user_id.in_(target_user_ids))
+    ).scalars())
+
+def annotate_bookmarks(db: Session, viewer_id, items, user_id_of):
+    """
+    一覧の各要素に閲覧者のブックマーク状態（is_bookmarked）を付けたコピーを返す
+    一覧は閲覧者によらず共有キャッシュに保存されているため、キャッシュ済みのオブジェクトは変更しない
+    """
+    bookmarked = fetch_bookmarked_user_ids(db, viewer_id, [user_id_of(item) for item in items])
+    return [item.model_copy(update={"is_bookmarked": user_id_of(item) in bookmarked}) for item in items]
+
+def add_bookmarks(db: Session, user_id, bookmarked_user_ids):
+    """
+    ブックマークを1文で追加し、追加した件数を返す（コミットは呼び出し側で行う）
+    INSERT ... SELECT で存在するユーザーだけを対象にし、登録済みの組はunique_bookmarkで無視する
+    （事前のSELECTが不要で、同時に追加されても重複エラーにならない）
+    """
+    bookmarked_user_ids = set(bookmarked_user_ids)
+    if not bookmarked_user_ids:
+        return 0
+    statement = (
+        insert(Bookmark)
+        .from_select(
+            ["bookmarking_user_id", "bookmarked_user_id"],
+            select(literal(user_id, Integer), DBUser.id).where(DBUser.id.in_(bookmarked_user_ids))
+        )
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+    )
+    return db.execute(statement).rowcount
+
+def remove_bookmarks(db: Session, user_id, bookmarked_user_ids):
+    """ブックマークを1文で削除し、削除した件数を返す（コミットは呼び出し側で行う）"""
+    bookmarked_user_ids = set(bookmarked_user_ids)
+    if not bookmarked_user_ids:
+        return 0
+    statement = (
+        delete(Bookmark)
+        .where(Bookmark.bookmarking_user_id == user_id)
+        .where(Bookmark.bookmarked_user_id.in_(bookmarked_user_ids))
+    )
+    return db.execute(statement).rowcount
@@ -0,0 +1,94 @@
+import logging
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from db_connection.shared_cache import get_shared_cache
+from db_model.tables import User as DBUser, SkillMaster, Department, JoinForm, WelcomeLevel, Profile, PostSkill
+
+# ロギング設定
+logger = logging.getLogger("shared_cache")
+
+# キャッシュのタグ
+# 共有キャッシュのエントリは、表示内容が依存するデータのタグを持つ
+SKILLS = "skills"  # スキルマスタ（スキル名）
+DEPARTMENTS = "departments"  # 部署マスタ（部署名）
+MASTER_DATA = "master_data"  # 部署・入社形態・歓迎度・スキルのマスタ（master_data.MasterDataCacheのバージョン確認用）
+# ベクトル検索の結果は connect_Pinecone.SEARCH_CACHE_TAG（clear_search_cache()で無効化）
+
+def skill_users_tag(skill_id):
+    """スキルを持つユーザーの一覧"""
+    return f"skill_users:{skill_id}"
+
+def department_users_tag(department_id):
+    """部署に所属するユーザーの一覧"""
+    return f"department_users:{department_id}"
+
+def user_tag(user_id):
+    """ユーザー1人分の表示内容（名前・プロフィール・スキル）"""
+    return f"user:{user_id}"
+
+def user_list_tags(response):
+    """ユーザー一覧のレスポンスから、含まれるユーザーのタグを作成"""
+    return [user_tag(user.id) for user in response.users]
+
+def _history_values(obj, attribute):
+    """属性の変更前後の値（Noneを除く）"""
+    history = get_history(obj, attribute)
+    return {value for value in (*history.added, *history.deleted, *history.unchanged) if value is not None}
+
+def _has_changes(obj, attribute):
+    return get_history(obj, attribute).has_changes()
+
+# 書き込みから無効化するタグを集め、コミット後にまとめて無効化する
+@event.listens_for(Session, "after_flush")
+def _collect_cache_tags(session, flush_context):
+    tags = session.info.setdefault("cache_tags", set())
+    moved_user_ids = session.info.setdefault("cache_moved_user_ids", set())
+
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        inserted_or_deleted = obj in session.new or obj in session.deleted
+        if isinstance(obj, SkillMaster):
+            tags.update([SKILLS, MASTER_DATA])
+        elif isinstance(obj, Department):
+            tags.update([DEPARTMENTS, MASTER_DATA])
+        elif isinstance(obj, (JoinForm, WelcomeLevel)):
+            tags.add(MASTER_DATA)
+        elif isinstance(obj, DBUser):
+            tags.add(user_tag(obj.id))
+        elif isinstance(obj, PostSkill):
+            for user_id in _history_values(obj, "user_id"):
+                tags.add(user_tag(user_id))
+            for skill_id in _history_values(obj, "skill_id"):
+                tags.add(skill_users_tag(skill_id))
+        elif isinstance(obj, Profile):
+            tags.add(user_tag(obj.user_id))
+            # 所属部署が変わると、部署の一覧と（部署のあるユーザーのみを返す）スキルの一覧が変わる
+            if inserted_or_deleted or _has_changes(obj, "department_id"):
+                for department_id in _history_values(obj, "department_id"):
+                    tags.add(department_users_tag(department_id))
+                moved_user_ids.add(obj.user_id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_cache_tags(session):
+    tags = session.info.pop("cache_tags", None) or set()
+    moved_user_ids = session.info.pop("cache_moved_user_ids", None)
+
+    if moved_user_ids:
+        # コミット後のセッションはSQLを発行できないため、別の接続で保有スキルを調べる
+        try:
+            with session.get_bind().connect() as conn:
+                skill_ids = conn.execute(
+                    select(PostSkill.skill_id).where(PostSkill.user_id.in_(moved_user_ids)).distinct()
+                ).scalars().all()
+            tags.update(skill_users_tag(skill_id) for skill_id in skill_ids)
+        except Exception as e:
+            logger.warning(f"保有スキルの取得に失敗したため、スキルの一覧をすべて無効化します: {e}")
+            tags.add(SKILLS)
+
+    if tags:
+        get_shared_cache().invalidate(tags)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_cache_tags(session):
+    session.info.pop("cache_tags", None)
+    session.info.pop("cache_moved_user_ids", None)
@@ -0,0 +1,45 @@
+import logging
+from db_connection.connect_MySQL import SessionLocal
+from db_connection.connect_Pinecone import async_search_similar_skills
+from db_connection.embedding import normalize_search_query
+from db_connection.executor import run_db
+from db_crud.lexical_index import lexical_index, get_lexical_index, rrf_fuse
+
+# ロギング設定
+logger = logging.getLogger("app")
+
+def build_lexical_index():
+    """文字列インデックスを取得する（未作成・期限切れなら作り直す。DB用スレッドプールから呼ぶ）"""
+    db = SessionLocal()
+    try:
+        return get_lexical_index(db)
+    finally:
+        db.close()
+
+async def hybrid_search(query, limit):
+    """
+    文字列インデックスとベクトル検索を組み合わせてスキルを検索する
+    1. スキル名・詳細スキル名に完全一致・前方一致すれば、その結果をすぐに返す（OpenAI・Pineconeを呼ばない）
+    2. それ以外は文字bigramの類似候補とベクトル検索の結果をRRFで統合する
+    3. 類似候補がなければベクトル検索の結果をそのまま返す
+    """
+    normalized = normalize_search_query(query)
+    if not normalized:
+        return []
+
+    index = lexical_index
+    if index.is_stale():
+        index = await run_db(build_lexical_index)
+
+    matches = index.lookup(normalized, limit)
+    if matches:
+        logger.info(f"文字列インデックスで一致: '{query}' -> {len(matches)}件")
+        return matches
+
+    vector_results = await async_search_similar_skills(query, limit)
+    lexical_results = index.similar(normalized, limit)
+    if not lexical_results:
+        return vector_results
+
+    logger.info(f"文字列・ベクトル検索を統合: 文字列 {len(lexical_results)}件, ベクトル {len(vector_results)}件")
+    return rrf_fuse([lexical_results, vector_results], limit)
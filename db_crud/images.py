@@ -0,0 +1,21 @@
+import hashlib
+
+def image_etag(user_id, updated_at):
+    """プロフィールの更新日時から画像のバージョン（ETag）を作成"""
+    version = updated_at.isoformat() if updated_at else ""
+    return hashlib.sha1(f"{user_id}:{version}".encode("utf-8")).hexdigest()[:16]
+
+def build_image_url(user_id, profile):
+    """画像取得用のURLを作成（画像がない場合はNone）"""
+    if not profile or not profile.has_image:
+        return None
+    return f"/users/{user_id}/image?v={image_etag(user_id, profile.updated_at)}"
+
+def etag_matches(if_none_match, etag):
+    """If-None-Matchヘッダーに指定のETagが含まれているか確認"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
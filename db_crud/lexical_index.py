@@ -0,0 +1,304 @@
+import os
+import time
+import bisect
+import logging
+import threading
+from collections import defaultdict
+from pathlib import Path
+from dotenv import load_dotenv
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from db_connection.embedding import normalize_search_query
+from db_model.tables import SkillMaster, DetailSkill, PostSkill
+
+# ロギング設定
+logger = logging.getLogger("lexical_index")
+
+# 環境変数の読み込み
+base_path = Path(__file__).parents[1]  # backendディレクトリへのパス
+env_path = base_path / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# インデックスを作り直す間隔（秒）
+LEXICAL_INDEX_REBUILD_SECONDS = int(os.getenv("LEXICAL_INDEX_REBUILD_SECONDS", "600"))
+# n-gramの類似度（Dice係数）がこの値以上の名前を候補にする
+LEXICAL_MIN_SIMILARITY = float(os.getenv("LEXICAL_MIN_SIMILARITY", "0.3"))
+# Reciprocal Rank Fusionの定数（順位の差をなだらかにする）
+RRF_K = 60
+
+def fold_kana(text):
+    """カタカナをひらがなに揃える（"マーケ"・"まーけ" を同じ名前として扱う）"""
+    return "".join(chr(ord(char) - 0x60) if "ァ" <= char <= "ヶ" else char for char in text)
+
+def normalize_lexical_text(text):
+    """インデックス用に名前を正規化する（normalize_search_queryに加えてカタカナをひらがなに揃える）"""
+    return fold_kana(normalize_search_query(text))
+
+def char_ngrams(text, n=2):
+    """文字n-gramの集合（分かち書きのない日本語の名前にも使える）"""
+    if len(text) < n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+def skill_match(skill_id, skill_name, score):
+    """検索結果（format_matchesと同じ形式、ユーザーはスキルの保有者に展開される）"""
+    return {
+        "skill_id": skill_id,
+        "skill_name": skill_name,
+        "user_id": None,
+        "user_name": None,
+        "text": skill_name,
+        "score": score
+    }
+
+class LexicalIndex:
+    """
+    スキル名・詳細スキル名のプロセス内の文字列インデックス
+    正規化した名前の完全一致（辞書）・前方一致（ソート済み配列の二分探索）・
+    文字bigramの類似度（転置インデックス）でスキルを検索する
+    入力補完（suggest）も同じ前方一致を使い、スキルの保有者数（PostSkillの件数）が多い順に並べる
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self.built_at = None
+
+    def _reset(self):
+        self.entries = []  # (正規化した名前, skill_id, 表示名, 種別 "skill" / "detail")
+        self.exact = defaultdict(list)  # 正規化した名前 -> エントリ番号
+        self.sorted_names = []  # (正規化した名前, エントリ番号) の昇順
+        self.postings = defaultdict(set)  # bigram -> エントリ番号
+        self.skill_names = {}  # skill_id -> スキル名
+        self.popularity = {}  # skill_id -> 保有者数
+
+    def build(self, db: Session):
+        """データベースからインデックス全体を作り直す"""
+        skills = db.execute(select(SkillMaster.skill_id, SkillMaster.name)).all()
+        details = db.execute(
+            select(DetailSkill.skill_id, DetailSkill.dskill_name).where(DetailSkill.skill_id.isnot(None))
+        ).all()
+        popularity = dict(db.execute(
+            select(PostSkill.skill_id, func.count(PostSkill.id)).group_by(PostSkill.skill_id)
+        ).all())
+
+        with self._lock:
+            self._reset()
+            self.popularity = popularity
+            for skill_id, name in skills:
+                self.skill_names[skill_id] = name
+                self._add_entry(skill_id, name, "skill")
+            for skill_id, name in details:
+                self._add_entry(skill_id, name, "detail")
+            self.sorted_names.sort()
+            self.built_at = time.monotonic()
+
+        logger.info(f"文字列インデックスを作成しました: スキル {len(skills)}件, 詳細スキル {len(details)}件")
+
+    def _add_entry(self, skill_id, name, kind):
+        normalized = normalize_lexical_text(name)
+        if not normalized:
+            return
+        entry_id = len(self.entries)
+        self.entries.append((normalized, skill_id, name, kind))
+        self.exact[normalized].append(entry_id)
+        self.sorted_names.append((normalized, entry_id))
+        for gram in char_ngrams(normalized):
+            self.postings[gram].add(entry_id)
+
+    def is_stale(self):
+        return self.built_at is None or time.monotonic() - self.built_at > LEXICAL_INDEX_REBUILD_SECONDS
+
+    def add_skill(self, skill_id, name):
+        """スキルを追加する（作り直しを待たずに検索対象にする）"""
+        with self._lock:
+            self.skill_names[skill_id] = name
+            self._insert(skill_id, name, "skill")
+
+    def add_detail_skill(self, skill_id, name):
+        with self._lock:
+            self._insert(skill_id, name, "detail")
+
+    def add_popularity(self, skill_id, delta):
+        """スキルの保有者数を増減する（PostSkillの追加・削除）"""
+        with self._lock:
+            self.popularity[skill_id] = max(self.popularity.get(skill_id, 0) + delta, 0)
+
+    def _insert(self, skill_id, name, kind):
+        before = len(self.entries)
+        self._add_entry(skill_id, name, kind)
+        if len(self.entries) > before:
+            self.sorted_names.pop()
+            bisect.insort(self.sorted_names, (self.entries[-1][0], before))
+
+    def _matches(self, ranked, limit):
+        """(スコア, skill_id) の順にスキル単位で重複を除いた検索結果を作成"""
+        results = []
+        seen = set()
+        for score, skill_id in ranked:
+            if skill_id in seen or skill_id not in self.skill_names:
+                continue
+            seen.add(skill_id)
+            results.append(skill_match(skill_id, self.skill_names[skill_id], score))
+            if len(results) >= limit:
+                break
+        return results
+
+    def _prefix_entries(self, normalized):
+        """正規化した名前がnormalizedで始まるエントリ番号（ロック内で呼ぶ）"""
+        entry_ids = []
+        position = bisect.bisect_left(self.sorted_names, (normalized, -1))
+        while position < len(self.sorted_names):
+            name, entry_id = self.sorted_names[position]
+            if not name.startswith(normalized):
+                break
+            entry_ids.append(entry_id)
+            position += 1
+        return entry_ids
+
+    def lookup(self, normalized, limit):
+        """
+        完全一致、なければ前方一致するスキルを返す（どちらもなければ空）
+        前方一致は名前が短い（クエリとの差が小さい）ものほど上位にする
+        """
+        normalized = fold_kana(normalized)
+        with self._lock:
+            exact = self.exact.get(normalized)
+            if exact:
+                return self._matches([(1.0, self.entries[entry_id][1]) for entry_id in exact], limit)
+
+            ranked = [
+                (len(normalized) / len(self.entries[entry_id][0]), self.entries[entry_id][1])
+                for entry_id in self._prefix_entries(normalized)
+            ]
+            ranked.sort(key=lambda item: -item[0])
+            return self._matches(ranked, limit)
+
+    def suggest(self, query, limit):
+        """
+        入力補完：クエリで始まる名前を返す
+        完全一致 → 保有者数の多い順 → 名前の短い順に並べ、同じ表示名は1件にまとめる
+        """
+        prefix = normalize_lexical_text(query)
+        if not prefix:
+            return []
+
+        with self._lock:
+            candidates = []
+            for entry_id in self._prefix_entries(prefix):
+                normalized, skill_id, name, kind = self.entries[entry_id]
+                candidates.append((
+                    normalized != prefix,
+                    -self.popularity.get(skill_id, 0),
+                    len(normalized),
+                    kind != "skill",
+                    name, skill_id, kind
+                ))
+            candidates.sort()
+
+            suggestions = []
+            seen = set()
+            for _, popularity, _, _, name, skill_id, kind in candidates:
+                if name in seen:
+                    continue
+                seen.add(name)
+                suggestions.append({
+                    "name": name,
+                    "skill_name": self.skill_names.get(skill_id, name),
+                    "type": kind,
+                    "user_count": -popularity,
+                })
+                if len(suggestions) >= limit:
+                    break
+        return suggestions
+
+    def similar(self, normalized, limit):
+        """文字bigramのDice係数がLEXICAL_MIN_SIMILARITY以上のスキルを類似度順に返す"""
+        query_grams = char_ngrams(fold_kana(normalized))
+        if not query_grams:
+            return []
+
+        with self._lock:
+            overlaps = defaultdict(int)
+            for gram in query_grams:
+                for entry_id in self.postings.get(gram, ()):
+                    overlaps[entry_id] += 1
+
+            ranked = []
+            for entry_id, overlap in overlaps.items():
+                name, skill_id, _, _ = self.entries[entry_id]
+                score = 2 * overlap / (len(query_grams) + len(char_ngrams(name)))
+                if score >= LEXICAL_MIN_SIMILARITY:
+                    ranked.append((score, skill_id))
+            ranked.sort(key=lambda item: -item[0])
+            return self._matches(ranked, limit)
+
+def rrf_fuse(rankings, limit, k=RRF_K):
+    """
+    複数の検索結果の順位をReciprocal Rank Fusionで統合する（スキル単位）
+    順位はRRFのスコア、返すscoreは各検索結果のうち最も高い類似度
+    """
+    fused = {}
+    for results in rankings:
+        rank = 0
+        seen = set()
+        for result in results:
+            skill_id = result.get("skill_id")
+            if skill_id is None or skill_id in seen:
+                continue
+            seen.add(skill_id)
+            rank += 1
+            rrf, match = fused.get(skill_id, (0.0, None))
+            if match is None:
+                match = skill_match(skill_id, result.get("skill_name"), result.get("score", 0.0))
+            else:
+                match["score"] = max(match["score"], result.get("score", 0.0))
+            fused[skill_id] = (rrf + 1 / (k + rank), match)
+
+    ranked = sorted(fused.values(), key=lambda item: -item[0])
+    return [match for _, match in ranked[:limit]]
+
+# プロセス内で共有するインデックス
+lexical_index = LexicalIndex()
+_build_lock = threading.Lock()
+
+def get_lexical_index(db: Session):
+    """インデックスを取得（未作成または再作成の間隔を過ぎていれば作り直す）"""
+    if lexical_index.is_stale():
+        with _build_lock:
+            if lexical_index.is_stale():
+                lexical_index.build(db)
+    return lexical_index
+
+# スキル・詳細スキルの追加と保有者数の変化をインデックスに反映する（コミットされた変更のみ）
+@event.listens_for(Session, "after_flush")
+def _collect_name_changes(session, flush_context):
+    changes = session.info.setdefault("lexical_index_changes", [])
+    for obj in session.new:
+        if isinstance(obj, SkillMaster):
+            changes.append(("add_skill", obj.skill_id, obj.name))
+        elif isinstance(obj, DetailSkill) and obj.skill_id is not None:
+            changes.append(("add_detail_skill", obj.skill_id, obj.dskill_name))
+        elif isinstance(obj, PostSkill):
+            changes.append(("add_popularity", obj.skill_id, 1))
+    for obj in session.deleted:
+        if isinstance(obj, PostSkill):
+            changes.append(("add_popularity", obj.skill_id, -1))
+    # 名前の変更・削除は次回の作り直しで反映する
+    if any(isinstance(obj, (SkillMaster, DetailSkill)) for obj in (*session.dirty, *session.deleted)):
+        changes.append(("rebuild",))
+
+@event.listens_for(Session, "after_commit")
+def _apply_name_changes(session):
+    changes = session.info.pop("lexical_index_changes", None)
+    if not changes or lexical_index.built_at is None:
+        return
+    for method, *args in changes:
+        if method == "rebuild":
+            lexical_index.built_at = None
+        else:
+            getattr(lexical_index, method)(*args)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_name_changes(session):
+    session.info.pop("lexical_index_changes", None)
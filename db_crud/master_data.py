@@ -0,0 +1,154 @@
+import os
+import time
+import logging
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from db_connection.shared_cache import get_shared_cache
+from db_crud.cache_tags import MASTER_DATA
+from db_model.tables import Department, JoinForm, WelcomeLevel, SkillMaster
+
+# ロギング設定
+logger = logging.getLogger("master_data")
+
+# 環境変数の読み込み
+base_path = Path(__file__).parents[1]  # backendディレクトリへのパス
+env_path = base_path / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# 他のワーカーでの変更を確認する間隔（秒、共有キャッシュのタグのバージョンを見るだけでDBには問い合わせない）
+MASTER_DATA_PROBE_SECONDS = float(os.getenv("MASTER_DATA_PROBE_SECONDS", "5"))
+# アプリを経由しない変更も反映するため、この間隔（秒）を過ぎたら必ず読み込み直す
+MASTER_DATA_MAX_AGE_SECONDS = int(os.getenv("MASTER_DATA_MAX_AGE_SECONDS", "600"))
+# スナップショットにないスキルIDで読み込み直すのは、IDごとにこの間隔（秒）に1回まで
+# （削除済みのスキルを指す古いベクトルなどで、リクエストのたびに読み込み直さないようにする）
+MASTER_DATA_MISS_RELOAD_SECONDS = float(os.getenv("MASTER_DATA_MISS_RELOAD_SECONDS", "60"))
+
+class MasterData:
+    """
+    部署・入社形態・歓迎度・スキルのマスタのスナップショット（ID -> 名前）
+    読み込み後は変更せず、新しいスナップショットに置き換える
+    """
+
+    def __init__(self, departments, join_forms, welcome_levels, skills, version):
+        self.departments = departments
+        self.join_forms = join_forms
+        self.welcome_levels = welcome_levels
+        self.skills = skills
+        self.version = version  # 読み込み前のMASTER_DATAタグのバージョン
+
+    @classmethod
+    def load(cls, db: Session, version):
+        return cls(
+            departments=dict(db.execute(select(Department.id, Department.name)).all()),
+            join_forms=dict(db.execute(select(JoinForm.id, JoinForm.name)).all()),
+            welcome_levels=dict(db.execute(select(WelcomeLevel.id, WelcomeLevel.level_name)).all()),
+            skills=dict(db.execute(select(SkillMaster.skill_id, SkillMaster.name)).all()),
+            version=version
+        )
+
+class MasterDataCache:
+    """
+    マスタのスナップショットをプロセス内で共有する
+    このプロセスでの書き込みはコミット時に、他のワーカーでの書き込みはタグのバージョンの確認で反映する
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.snapshot = None
+        self.loaded_at = None
+        self.probed_at = None
+        self.missed_at = {}  # スナップショットになかったスキルID -> 読み込み直した時刻
+
+    def _is_current(self, snapshot, now):
+        if snapshot is None or now - self.loaded_at > MASTER_DATA_MAX_AGE_SECONDS:
+            return False
+        if now - self.probed_at < MASTER_DATA_PROBE_SECONDS:
+            return True
+        versions = get_shared_cache().get_versions([MASTER_DATA])
+        self.probed_at = now
+        # 共有キャッシュに接続できない場合は読み込み直しの間隔まで使い続ける
+        return versions is None or versions[MASTER_DATA] == snapshot.version
+
+    def get(self, db: Session):
+        snapshot = self.snapshot
+        if self._is_current(snapshot, time.monotonic()):
+            return snapshot
+
+        with self._lock:
+            # 待っている間に他のスレッドが読み込んでいればそれを使う
+            if self.snapshot is not snapshot and self.snapshot is not None:
+                return self.snapshot
+
+            # 読み込み中に変更された場合に次の確認で読み込み直すよう、バージョンは先に取得する
+            versions = get_shared_cache().get_versions([MASTER_DATA])
+            snapshot = MasterData.load(db, versions[MASTER_DATA] if versions else None)
+            now = time.monotonic()
+            self.snapshot = snapshot
+            self.loaded_at = self.probed_at = now
+
+        logger.info(
+            f"マスタを読み込みました: 部署 {len(snapshot.departments)}件, 入社形態 {len(snapshot.join_forms)}件, "
+            f"歓迎度 {len(snapshot.welcome_levels)}件, スキル {len(snapshot.skills)}件"
+        )
+        return snapshot
+
+    def get_with_skills(self, db: Session, skill_ids):
+        """
+        skill_idsのスキルを含むスナップショットを取得する
+        他のワーカーで追加されたばかりのスキルがなければ読み込み直すが、
+        同じIDでの読み込み直しはMASTER_DATA_MISS_RELOAD_SECONDSに1回までとする（それでもないIDは呼び出し側で除く）
+        """
+        snapshot = self.get(db)
+        missing = set(skill_ids) - snapshot.skills.keys()
+        if not missing:
+            return snapshot
+
+        now = time.monotonic()
+        with self._lock:
+            # 待っている間に他のスレッドが読み込み直していればそれを使う
+            if self.snapshot is not snapshot and self.snapshot is not None:
+                return self.snapshot
+            if all(now - self.missed_at.get(skill_id, float("-inf")) < MASTER_DATA_MISS_RELOAD_SECONDS for skill_id in missing):
+                return snapshot
+            self.missed_at = {
+                skill_id: missed_at for skill_id, missed_at in self.missed_at.items()
+                if now - missed_at < MASTER_DATA_MISS_RELOAD_SECONDS
+            }
+            self.missed_at.update(dict.fromkeys(missing, now))
+            self.snapshot = None
+        return self.get(db)
+
+    def invalidate(self):
+        self.snapshot = None
+
+# プロセス内で共有するスナップショット
+master_data_cache = MasterDataCache()
+
+def get_master_data(db: Session, skill_ids=()):
+    """
+    最新のマスタのスナップショットを取得（必要な場合のみDBから読み込む）
+    skill_idsを指定すると、スナップショットにないスキルがある場合に読み込み直す（IDごとに間隔を空ける）
+    """
+    if skill_ids:
+        return master_data_cache.get_with_skills(db, skill_ids)
+    return master_data_cache.get(db)
+
+# このプロセスでのマスタへの書き込みは、コミット後すぐに反映する
+_MASTER_TABLES = (Department, JoinForm, WelcomeLevel, SkillMaster)
+
+@event.listens_for(Session, "after_flush")
+def _collect_master_changes(session, flush_context):
+    if any(isinstance(obj, _MASTER_TABLES) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info["master_data_changed"] = True
+
+@event.listens_for(Session, "after_commit")
+def _apply_master_changes(session):
+    if session.info.pop("master_data_changed", False):
+        master_data_cache.invalidate()
+
+@event.listens_for(Session, "after_rollback")
+def _discard_master_changes(session):
+    session.info.pop("master_data_changed", None)
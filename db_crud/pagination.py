@@ -0,0 +1,40 @@
+import json
+import base64
+from fastapi import HTTPException
+from db_connection.shared_cache import get_shared_cache
+
+# ページサイズの既定値と上限
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# 件数（total）のキャッシュの有効期間（秒）。ページとは別に共有キャッシュに保持する
+COUNT_CACHE_TTL = 300
+
+def encode_cursor(last_id):
+    """最後に返したユーザーIDから次ページ用の不透明なカーソルを作成"""
+    payload = json.dumps({"after": last_id}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor):
+    """カーソルから直前のページの最後のユーザーIDを取り出す（カーソルなしは0）"""
+    if not cursor:
+        return 0
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        after = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))["after"]
+        if not isinstance(after, int) or isinstance(after, bool) or after < 0:
+            raise ValueError(after)
+        return after
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def paginate(rows, limit, key=lambda row: row.id):
+    """limit + 1件取得した結果を1ページ分と次ページのカーソルに分ける"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(key(rows[-1]))
+    return rows, None
+
+def cached_count(key, tags, count):
+    """件数を共有キャッシュから取得し、なければcount()で数えて保存する（tagsの無効化で数え直す）"""
+    return get_shared_cache().get_or_set(("count", *key), count, tags=tags, ttl=COUNT_CACHE_TTL)
@@ -0,0 +1,36 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+
+class QueryStats:
+    """record_queries() の間に実行されたSQLと取得行数"""
+
+    def __init__(self):
+        self.statements = []
+        self.rows_fetched = 0
+
+    @property
+    def statement_count(self):
+        return len(self.statements)
+
+@contextmanager
+def record_queries(bind):
+    """
+    エンジンで実行されたSQL文と取得行数を記録する
+    取得行数はDBドライバのrowcountを使うため、rowcountを返さないドライバ（SQLiteなど）では0のまま
+    """
+    stats = QueryStats()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats.statements.append((statement, parameters))
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if cursor.description is not None and cursor.rowcount and cursor.rowcount > 0:
+            stats.rows_fetched += cursor.rowcount
+
+    event.listen(bind, "before_cursor_execute", before_cursor_execute)
+    event.listen(bind, "after_cursor_execute", after_cursor_execute)
+    try:
+        yield stats
+    finally:
+        event.remove(bind, "before_cursor_execute", before_cursor_execute)
+        event.remove(bind, "after_cursor_execute", after_cursor_execute)
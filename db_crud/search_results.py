@@ -0,0 +1,120 @@
+from collections import defaultdict
+import logging
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from db_model.tables import User as DBUser, PostSkill
+from db_model.schemas import SearchResult
+from db_crud.images import build_image_url
+from db_crud.master_data import get_master_data
+from db_crud.user_cards import user_card_select
+
+# ロギング設定
+logger = logging.getLogger("app")
+
+def hydrate_search_results(db: Session, results, offset=0, limit=None):
+    """
+    ベクトル検索結果からSearchResultのリストを組み立てる
+    スキル単位のマッチは保有ユーザー（PostSkill）に展開し、展開後の (スキル, ユーザー) を
+    検索結果の順位（RRFで統合した順）のまま並べてoffset件目からlimit件を返す（返り値は (検索結果, 展開後の総件数)）
+    マッチごとにクエリを発行せず、ポストスキル・ユーザーをそれぞれ1回のIN (...)クエリで
+    まとめて取得する（ユーザーは返すページ分のみ、スキル名・部署名などはマスタから引く）
+    """
+    # 検索結果からスキルIDとユーザーを持たないスキルIDを収集
+    skill_ids = set()
+    expand_skill_ids = set()
+    for result in results:
+        skill_id = result.get("skill_id")
+        if not skill_id:
+            continue
+        skill_ids.add(int(skill_id))
+        if not result.get("user_id"):
+            expand_skill_ids.add(int(skill_id))
+
+    if not skill_ids:
+        return [], 0
+
+    # スキル名はマスタのスナップショットから引く（他のワーカーで追加されたばかりのスキルがあれば読み込み直す）
+    master = get_master_data(db, skill_ids)
+    skills = master.skills
+
+    # ユーザーIDがないマッチはスキルを持つ全ユーザーに展開する（IDのみ取得）
+    skill_user_ids = defaultdict(list)
+    if expand_skill_ids:
+        post_skills = db.execute(
+            select(PostSkill.skill_id, PostSkill.user_id)
+            .where(PostSkill.skill_id.in_(expand_skill_ids))
+            .order_by(PostSkill.id)
+        ).all()
+        for skill_id, user_id in post_skills:
+            skill_user_ids[skill_id].append(user_id)
+
+    # (スキル, ユーザー) ごとに最も上位の順位と最も高いスコアを残し、検索結果の順位で並べる
+    # scoreは文字列の類似度とベクトルの類似度が混在するため表示のみに使い、並び替えには使わない
+    # （同じ順位の中ではスコアの高い順、スキル内はPostSkillの登録順）
+    expanded = {}
+    for rank, result in enumerate(results):
+        skill_id = result.get("skill_id")
+        if not skill_id:
+            continue
+        skill_id = int(skill_id)
+        if skill_id not in skills:
+            logger.warning(f"スキルID {skill_id} が見つかりません")
+            continue
+
+        user_id = result.get("user_id")
+        if user_id:
+            target_user_ids = [int(user_id)]
+        else:
+            target_user_ids = skill_user_ids.get(skill_id, [])
+            if not target_user_ids:
+                logger.warning(f"スキルID {skill_id} に関連するポストスキルが見つかりません")
+                continue
+
+        score = result.get("score", 0.0)
+        for target_user_id in target_user_ids:
+            key = (skill_id, target_user_id)
+            best_rank, best_score = expanded.get(key, (rank, score))
+            expanded[key] = (min(best_rank, rank), max(best_score, score))
+
+    ranked = sorted(expanded.items(), key=lambda item: (item[1][0], -item[1][1]))
+    page = ranked[offset:] if limit is None else ranked[offset:offset + limit]
+
+    # 返すページのユーザーだけをカード表示用の列で一括取得（ORMオブジェクトは作らない）
+    users = {}
+    page_user_ids = {user_id for (_, user_id), _ in page}
+    if page_user_ids:
+        users = {
+            row.user_id: row
+            for row in db.execute(user_card_select().where(DBUser.id.in_(page_user_ids))).all()
+        }
+
+    # メモリ上のマップから検索結果を作成
+    search_results = []
+    for (skill_id, user_id), (_, score) in page:
+        row = users.get(user_id)
+        if not row:
+            logger.warning(f"ユーザーID {user_id} が見つかりません")
+            continue
+        search_results.append(build_search_result(row, skill_id, skills[skill_id], score, master))
+
+    return search_results, len(ranked)
+
+def build_search_result(row, skill_id, skill_name, score, master):
+    """ユーザーカードの行とスキルから検索結果を作成（部署名などはマスタから引く）"""
+    # 画像は専用エンドポイントから取得するためURLのみ返す
+    image_url = build_image_url(row.user_id, row)
+
+    return SearchResult(
+        user_id=row.user_id,
+        user_name=row.user_name or "名前なし",
+        skill_id=skill_id,
+        skill_name=skill_name,
+        joinForm=master.join_forms.get(row.join_form_id) or "未設定",
+        welcome_level=master.welcome_levels.get(row.welcome_level_id) or "未設定",
+        description=None,
+        department_id=row.department_id,
+        department_name=master.departments.get(row.department_id),
+        similarity_score=score,
+        image_url=image_url,
+        image_data_type=row.image_data_type if image_url else None
+    )
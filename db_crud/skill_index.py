@@ -0,0 +1,195 @@
+import os
+import time
+import logging
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from db_connection.embedding import normalize_search_query
+from db_model.tables import SkillMaster, PostSkill, Profile
+
+# ロギング設定
+logger = logging.getLogger("skill_index")
+
+# 環境変数の読み込み
+base_path = Path(__file__).parents[1]  # backendディレクトリへのパス
+env_path = base_path / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# インデックスを作り直す間隔（秒）。他のワーカーやSQLで直接行われた変更もこの間隔で反映される
+SKILL_INDEX_REBUILD_SECONDS = int(os.getenv("SKILL_INDEX_REBUILD_SECONDS", "600"))
+
+def parse_skill_names(value):
+    """カンマ区切りのスキル名をリストにする（空の要素は除く）"""
+    if not value:
+        return []
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+def iter_bits(bits):
+    """ビットセット（int）の立っているビット番号を昇順に返す"""
+    while bits:
+        lowest = bits & -bits
+        yield lowest.bit_length() - 1
+        bits ^= lowest
+
+class SkillIndex:
+    """
+    PostSkillから作るプロセス内の転置インデックス
+    スキルごとに保有ユーザーIDのビットセット、ユーザーごとに保有スキルIDのビットセットを持ち、
+    スキルの組み合わせ（AND / OR / NOT）をSQLの結合なしにビット演算で求める
+    /skills/{skill_name} と同じく、検索対象は部署に所属するユーザーに限る
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.skill_users = {}  # skill_id -> ユーザーIDのビットセット
+        self.user_skills = {}  # user_id -> スキルIDのビットセット
+        self.skill_ids = {}  # 正規化したスキル名 -> skill_id
+        self.all_users = 0  # 部署に所属するユーザーIDのビットセット（検索対象の全体。NOTのみの検索にも使う）
+        self.built_at = None
+
+    def build(self, db: Session):
+        """データベースからインデックス全体を作り直す"""
+        skill_ids = {
+            normalize_search_query(name): skill_id
+            for name, skill_id in db.execute(select(SkillMaster.name, SkillMaster.skill_id))
+        }
+        all_users = 0
+        for (user_id,) in db.execute(select(Profile.user_id).where(Profile.department_id.isnot(None))):
+            all_users |= 1 << user_id
+
+        skill_users = {}
+        user_skills = {}
+        for user_id, skill_id in db.execute(select(PostSkill.user_id, PostSkill.skill_id)):
+            skill_users[skill_id] = skill_users.get(skill_id, 0) | (1 << user_id)
+            user_skills[user_id] = user_skills.get(user_id, 0) | (1 << skill_id)
+
+        # 作り直した内容はまとめて差し替える（検索中のスレッドは古いインデックスをそのまま使える）
+        with self._lock:
+            self.skill_ids = skill_ids
+            self.all_users = all_users
+            self.skill_users = skill_users
+            self.user_skills = user_skills
+            self.built_at = time.monotonic()
+
+        logger.info(f"スキルインデックスを作成しました: スキル {len(skill_users)}件, ユーザー {len(user_skills)}人")
+
+    def is_stale(self):
+        return self.built_at is None or time.monotonic() - self.built_at > SKILL_INDEX_REBUILD_SECONDS
+
+    @property
+    def max_user_id(self):
+        """検索対象のユーザーIDの最大値（対象がいなければ0）"""
+        return max(self.all_users.bit_length() - 1, 0)
+
+    def add_skill(self, skill_id, name):
+        with self._lock:
+            self.skill_ids[normalize_search_query(name)] = skill_id
+
+    def set_user_department(self, user_id, has_department):
+        """部署の有無に合わせてユーザーを検索対象に追加・除外する"""
+        with self._lock:
+            if has_department:
+                self.all_users |= 1 << user_id
+            else:
+                self.all_users &= ~(1 << user_id)
+
+    def add_post_skill(self, user_id, skill_id):
+        with self._lock:
+            self.skill_users[skill_id] = self.skill_users.get(skill_id, 0) | (1 << user_id)
+            self.user_skills[user_id] = self.user_skills.get(user_id, 0) | (1 << skill_id)
+
+    def remove_post_skill(self, user_id, skill_id):
+        with self._lock:
+            self.skill_users[skill_id] = self.skill_users.get(skill_id, 0) & ~(1 << user_id)
+            self.user_skills[user_id] = self.user_skills.get(user_id, 0) & ~(1 << skill_id)
+
+    def users_with(self, skill_name):
+        """
+        スキル名から保有ユーザーのビットセットを取得（存在しないスキルは0）
+        全角半角・大文字小文字・空白の違いは無視する（"python"・"ＰＹＴＨＯＮ" は "Python" と同じ）
+        """
+        skill_id = self.skill_ids.get(normalize_search_query(skill_name))
+        if skill_id is None:
+            return 0
+        return self.skill_users.get(skill_id, 0)
+
+    def query(self, all_skills=(), any_skills=(), none_skills=()):
+        """
+        スキルの組み合わせに合うユーザーIDのビットセットを返す
+        all_skills: すべて保有 / any_skills: いずれかを保有 / none_skills: いずれも保有しない
+        """
+        with self._lock:
+            bits = self.all_users
+            for name in all_skills:
+                bits &= self.users_with(name)
+            if any_skills:
+                any_bits = 0
+                for name in any_skills:
+                    any_bits |= self.users_with(name)
+                bits &= any_bits
+            for name in none_skills:
+                bits &= ~self.users_with(name)
+        return bits
+
+    def page(self, bits, after_id, limit):
+        """
+        ビットセットからafter_idより大きいユーザーIDを昇順にlimit件まで取り出す
+        after_idは0以上・max_user_id以下であること（マスクの大きさがafter_idで決まるため）
+        """
+        if not 0 <= after_id <= self.max_user_id:
+            raise ValueError(f"after_idが範囲外です: {after_id}")
+        bits &= ~((1 << (after_id + 1)) - 1)
+        user_ids = []
+        for user_id in iter_bits(bits):
+            user_ids.append(user_id)
+            if len(user_ids) >= limit:
+                break
+        return user_ids
+
+# プロセス内で共有するインデックス
+skill_index = SkillIndex()
+_build_lock = threading.Lock()
+
+def get_skill_index(db: Session):
+    """インデックスを取得（未作成または再作成の間隔を過ぎていれば作り直す）"""
+    if skill_index.is_stale():
+        with _build_lock:
+            # 待っている間に他のスレッドが作り直した場合はそのまま使う
+            if skill_index.is_stale():
+                skill_index.build(db)
+    return skill_index
+
+# 書き込みをインデックスに反映する（コミットされた変更のみ）
+@event.listens_for(Session, "after_flush")
+def _collect_skill_changes(session, flush_context):
+    changes = session.info.setdefault("skill_index_changes", [])
+    for obj in session.new:
+        if isinstance(obj, PostSkill):
+            changes.append(("add_post_skill", obj.user_id, obj.skill_id))
+        elif isinstance(obj, SkillMaster):
+            changes.append(("add_skill", obj.skill_id, obj.name))
+        elif isinstance(obj, Profile):
+            changes.append(("set_user_department", obj.user_id, obj.department_id is not None))
+    for obj in session.dirty:
+        if isinstance(obj, Profile) and get_history(obj, "department_id").has_changes():
+            changes.append(("set_user_department", obj.user_id, obj.department_id is not None))
+    for obj in session.deleted:
+        if isinstance(obj, PostSkill):
+            changes.append(("remove_post_skill", obj.user_id, obj.skill_id))
+        elif isinstance(obj, Profile):
+            changes.append(("set_user_department", obj.user_id, False))
+
+@event.listens_for(Session, "after_commit")
+def _apply_skill_changes(session):
+    changes = session.info.pop("skill_index_changes", None)
+    if not changes or skill_index.built_at is None:
+        return
+    for method, *args in changes:
+        getattr(skill_index, method)(*args)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_skill_changes(session):
+    session.info.pop("skill_index_changes", None)
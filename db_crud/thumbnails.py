@@ -0,0 +1,102 @@
+import os
+import io
+import logging
+import tempfile
+from pathlib import Path
+from PIL import Image, ImageOps, UnidentifiedImageError
+from dotenv import load_dotenv
+
+# ロギング設定
+logger = logging.getLogger("thumbnails")
+
+# 環境変数の読み込み
+base_path = Path(__file__).parents[1]  # backendディレクトリへのパス
+env_path = base_path / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# サムネイルのキャッシュディレクトリ
+IMAGE_CACHE_DIR = Path(os.getenv("IMAGE_CACHE_DIR", str(base_path / ".cache" / "images")))
+
+# 生成するサムネイルのサイズ（正方形、px）と形式
+THUMBNAIL_SIZES = (64, 128, 256)
+THUMBNAIL_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+THUMBNAIL_QUALITY = 85
+
+def choose_thumbnail_format(accept):
+    """AcceptヘッダーからWebPかJPEGかを選ぶ"""
+    if accept and "image/webp" in accept:
+        return "webp"
+    return "jpeg"
+
+def thumbnail_media_type(fmt):
+    return THUMBNAIL_FORMATS[fmt][1]
+
+def thumbnail_path(user_id, version, size, fmt):
+    """ユーザーIDと画像のバージョン（updated_at由来）をキーにしたキャッシュファイルのパス"""
+    return IMAGE_CACHE_DIR / f"{user_id}_{version}_{size}.{fmt}"
+
+def create_thumbnail(image_data, user_id, version, size, fmt):
+    """
+    画像から正方形のサムネイルを作成してキャッシュディレクトリに保存し、パスを返す
+    Pillowで読み込めない画像（SVG・破損・途中で切れたファイルなど）の場合は何も保存せずNoneを返す
+    同じユーザーの古いバージョンのサムネイルは削除する
+    """
+    path = thumbnail_path(user_id, version, size, fmt)
+    if path.exists():
+        return path
+
+    try:
+        data = _render_thumbnail(image_data, size, THUMBNAIL_FORMATS[fmt][0])
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        logger.warning(f"サムネイルを作成できない画像です: user_id={user_id}: {e}")
+        return None
+
+    # 呼び出しごとの一時ファイルに書き込んでから置き換える（同じワーカーの他のスレッド・他のワーカーと同時に生成しても壊れない）
+    IMAGE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=IMAGE_CACHE_DIR, prefix=f"{path.name}.", suffix=".tmp", delete=False) as tmp_file:
+        tmp_path = Path(tmp_file.name)
+        try:
+            tmp_file.write(data)
+        except BaseException:
+            tmp_file.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    # 古いバージョンのサムネイルを削除
+    for old_path in IMAGE_CACHE_DIR.glob(f"{user_id}_*"):
+        if not old_path.name.startswith(f"{user_id}_{version}_") and not old_path.name.endswith(".tmp"):
+            try:
+                old_path.unlink()
+            except FileNotFoundError:
+                pass
+
+    logger.info(f"サムネイルを作成しました: {path.name}")
+    return path
+
+def _render_thumbnail(image_data, size, pil_format):
+    """画像を正方形に切り抜いて縮小し、指定した形式でエンコードしたバイト列を返す"""
+    with Image.open(io.BytesIO(image_data)) as image:
+        image = ImageOps.exif_transpose(image)
+        thumbnail = ImageOps.fit(image, (size, size), method=Image.LANCZOS)
+
+    # JPEGは透過に対応していないため白背景に合成する
+    if pil_format == "JPEG" and thumbnail.mode != "RGB":
+        background = Image.new("RGB", thumbnail.size, (255, 255, 255))
+        if thumbnail.mode in ("RGBA", "LA", "P"):
+            thumbnail = thumbnail.convert("RGBA")
+            background.paste(thumbnail, mask=thumbnail.getchannel("A"))
+        else:
+            background.paste(thumbnail.convert("RGB"))
+        thumbnail = background
+
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, format=pil_format, quality=THUMBNAIL_QUALITY)
+    return buffer.getvalue()
@@ -0,0 +1,70 @@
+from collections import defaultdict
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from db_model.tables import User as DBUser, Profile, PostSkill
+from db_crud.images import build_image_url
+from db_crud.master_data import get_master_data
+
+def user_card_select(*extra_columns):
+    """
+    ユーザーカード（一覧表示用のユーザー情報）を取得するSELECT文
+    ORMオブジェクトを作らず、必要な列だけをフラットな行として取得する
+    プロフィールがないユーザーも取得するため外部結合にする
+    部署・入社形態・歓迎度はIDのみ取得し、名前はマスタのスナップショットから引く（結合しない）
+    """
+    return (
+        select(
+            DBUser.id.label("user_id"),
+            DBUser.name.label("user_name"),
+            Profile.career,
+            Profile.pr,
+            Profile.image_data_type,
+            Profile.updated_at,
+            Profile.has_image,
+            Profile.department_id,
+            Profile.join_form_id,
+            Profile.welcome_level_id,
+            *extra_columns
+        )
+        .select_from(DBUser)
+        .outerjoin(Profile, DBUser.id == Profile.user_id)
+    )
+
+def fetch_user_skill_names(db: Session, user_ids):
+    """ユーザーIDごとのスキル名リストを1回のIN (...)クエリで取得（スキル名はマスタから引く）"""
+    skills = defaultdict(list)
+    if not user_ids:
+        return skills
+    rows = db.execute(
+        select(PostSkill.user_id, PostSkill.skill_id)
+        .where(PostSkill.user_id.in_(set(user_ids)))
+        .order_by(PostSkill.user_id, PostSkill.id)
+    ).all()
+    skill_names = get_master_data(db, {skill_id for _, skill_id in rows}).skills
+    for user_id, skill_id in rows:
+        if skill_id in skill_names:
+            skills[user_id].append(skill_names[skill_id])
+    return skills
+
+def fetch_user_cards(db: Session, statement):
+    """user_card_select() の行と、その行のユーザーのスキル名を取得"""
+    rows = db.execute(statement).all()
+    skills = fetch_user_skill_names(db, [row.user_id for row in rows])
+    return rows, skills
+
+def serialize_user_card(row, skills, master):
+    """ユーザーカードの行をレスポンス用の辞書（UserResponseの形）に変換（IDの名前はマスタから引く）"""
+    # 画像は専用エンドポイントから取得するためURLのみ返す
+    image_url = build_image_url(row.user_id, row)
+    return {
+        "id": row.user_id,
+        "name": row.user_name,
+        "department": master.departments.get(row.department_id) or "未所属",
+        "yearsOfService": row.career or 0,
+        "skills": skills.get(row.user_id, []),
+        "description": row.pr or "",
+        "joinForm": master.join_forms.get(row.join_form_id) or "未設定",
+        "welcome_level": master.welcome_levels.get(row.welcome_level_id) or "未設定",
+        "image_url": image_url,
+        "image_data_type": row.image_data_type if image_url else None,
+    }
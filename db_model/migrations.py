@@ -0,0 +1,65 @@
+import sys
+from pathlib import Path
+from sqlalchemy import inspect
+
+# 絶対パスを取得してpythonパスに追加
+current_dir = Path(__file__).parent.absolute()  # db_modelディレクトリ
+project_root = current_dir.parent  # プロジェクトルート
+sys.path.insert(0, str(project_root))
+
+from db_connection.connect_MySQL import engine, Base
+import db_model.tables  # noqa: F401  モデルをBase.metadataに登録する
+
+def create_tables(bind=engine):
+    """モデルに定義されていて、データベースにないテーブルを作成する（既存のテーブルは変更しない）"""
+    existing_tables = set(inspect(bind).get_table_names())
+    missing = [table for table in Base.metadata.sorted_tables if table.name not in existing_tables]
+    if not missing:
+        print("不足しているテーブルはありません")
+        return []
+
+    Base.metadata.create_all(bind, tables=missing)
+    print(f"{len(missing)}件のテーブルを作成しました: {', '.join(table.name for table in missing)}")
+    return missing
+
+def find_missing_indexes(bind):
+    """モデルに定義されていて、既存のデータベースにないインデックスを返す"""
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name or ""):
+            # Column(index=True) の自動インデックスは主キーと重複するため対象外
+            if index.name and index.name.startswith("ix_"):
+                continue
+            if index.name not in existing:
+                missing.append(index)
+    return missing
+
+def create_missing_indexes(bind=engine):
+    """既存のデータベースに不足しているインデックスを作成する（作成済みのものはスキップ）"""
+    missing = find_missing_indexes(bind)
+    if not missing:
+        print("不足しているインデックスはありません")
+        return []
+
+    with bind.begin() as conn:
+        for index in missing:
+            columns = ", ".join(column.name for column in index.columns)
+            print(f"インデックスを作成します: {index.table.name}.{index.name} ({columns})")
+            index.create(bind=conn)
+
+    print(f"{len(missing)}件のインデックスを作成しました")
+    return missing
+
+def migrate(bind=engine):
+    """テーブルとインデックスをモデルの定義に合わせる（アプリの起動時には実行しない）"""
+    create_tables(bind)
+    create_missing_indexes(bind)
+
+if __name__ == "__main__":
+    migrate()
@@ -25,8 +25,9 @@ class UserResponse(BaseModel):
     description: str
     joinForm: str  # 入社形態を追加
     welcome_level: Optional[str] = None
-    image_data: Optional[str] = None  # Base64エンコードされた画像データ
+    image_url: Optional[str] = None  # 画像取得用URL（バージョン付き、/users/{user_id}/image）
     image_data_type: Optional[str] = None  # 画像のMIMEタイプ
+    is_bookmarked: Optional[bool] = None  # viewer_idを指定した場合のみ、閲覧者がブックマークしているか
     class Config:
         from_attributes = True
 
@@ -44,7 +45,7 @@ class UserDetailResponse(BaseModel):
     skills: List[str]
     experiences: List[Dict[str, str]]
     description: Optional[str] = None
-    image_data: Optional[str] = None  # Base64エンコードされた画像データ
+    image_url: Optional[str] = None  # 画像取得用URL（バージョン付き、/users/{user_id}/image）
     image_data_type: Optional[str] = None  # 画像のMIMEタイプ
     welcome_level: Optional[str] = None
 
@@ -61,6 +62,8 @@ class DepartmentCreate(DepartmentBase):
 class DepartmentResponse(DepartmentBase):
     name: str
     users: List[UserResponse] = []
+    next_cursor: Optional[str] = None  # 次ページ取得用のカーソル（最後のページはNone）
+    total: Optional[int] = None  # 総件数（include_total=trueの場合のみ）
 
     class Config:
         from_attributes = True
@@ -110,9 +113,31 @@ class SkillMasterResponse(SkillMasterBase):
 class SkillResponse(BaseModel):
     name: str
     users: List[UserResponse] = []
+    next_cursor: Optional[str] = None  # 次ページ取得用のカーソル（最後のページはNone）
+    total: Optional[int] = None  # 総件数（include_total=trueの場合のみ）
     class Config:
         from_attributes = True
 
+# スキル組み合わせ検索のレスポンス
+class SkillQueryResponse(BaseModel):
+    all: List[str] = []  # すべて保有するスキル
+    any: List[str] = []  # いずれかを保有するスキル
+    none: List[str] = []  # 保有しないスキル
+    users: List[UserResponse] = []
+    next_cursor: Optional[str] = None  # 次ページ取得用のカーソル（最後のページはNone）
+    total: int = 0  # 条件に合うユーザーの総数
+
+# スキル名の入力補完
+class SkillSuggestion(BaseModel):
+    name: str  # 補完候補（スキル名または詳細スキル名）
+    skill_name: str  # 候補が属するスキル名
+    type: str  # "skill" または "detail"
+    user_count: int = 0  # スキルの保有者数
+
+class SkillSuggestResponse(BaseModel):
+    query: str
+    suggestions: List[SkillSuggestion] = []
+
 # 詳細スキル関連スキーマ
 class DetailSkillBase(BaseModel):
     name: str
@@ -242,7 +267,7 @@ class BookmarkResponse(BookmarkBase):
     description: Optional[str] = None
     joinForm: Optional[str] = None
     welcome_level: Optional[str] = None
-    image_data: Optional[str] = None  # Base64エンコードされた画像データ
+    image_url: Optional[str] = None  # 画像取得用URL（バージョン付き、/users/{user_id}/image）
     image_data_type: Optional[str] = None  # 画像のMIMEタイプ
     created_at: datetime
 
@@ -257,6 +282,28 @@ class BookmarkListResponse(BaseModel):
     class Config:
         orm_mode = True
 
+# ブックマークの追加・削除の結果
+class BookmarkWriteResponse(BaseModel):
+    bookmarking_user_id: int
+    bookmarked_user_id: int
+    changed: bool  # 追加・削除が行われたか（登録済み・未登録の場合はFalse）
+
+# ブックマークの一括更新
+class BookmarkBatchRequest(BaseModel):
+    add: List[int] = []  # ブックマークするユーザーID
+    remove: List[int] = []  # ブックマークを外すユーザーID
+
+class BookmarkBatchResponse(BaseModel):
+    added: int  # 追加した件数（登録済み・存在しないユーザーは含まない）
+    removed: int  # 削除した件数
+
+# ブックマーク状態の一括確認
+class BookmarkStatusRequest(BaseModel):
+    user_ids: List[int]  # 状態を確認するユーザーID
+
+class BookmarkStatusResponse(BaseModel):
+    statuses: Dict[int, bool]  # ユーザーID -> ブックマークしているか
+
 # 検索関連スキーマ
 class SearchQuery(BaseModel):
     query: str
@@ -273,23 +320,36 @@ class SearchResult(BaseModel):
     department_id: Optional[int] = None
     department_name: Optional[str] = None
     similarity_score: float
-    image_data: Optional[str] = None  # Base64エンコードされた画像データ
+    image_url: Optional[str] = None  # 画像取得用URL（バージョン付き、/users/{user_id}/image）
     image_data_type: Optional[str] = None  # 画像のMIMEタイプ
+    is_bookmarked: Optional[bool] = None  # viewer_idを指定した場合のみ、閲覧者がブックマークしているか
     class Config:
         from_attributes = True
 
 class SearchResponse(BaseModel):
     results: List[SearchResult]
-    total: int 
+    total: int  # スキルを保有ユーザーに展開した後の総件数
+    next_offset: Optional[int] = None  # 次ページ取得用のoffset（最後のページはNone）
 
 # ログインスキーマの追加
 class LoginRequest(BaseModel):
     email: str
     password: str
 
+class TokenResponse(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+    expires_in: int  # アクセストークンの有効期限（秒）
+
 class LoginResponse(BaseModel):
     id: int
-    name: str
+    name: Optional[str] = None
     email: str
     success: bool
-    message: str
\ No newline at end of file
+    message: str
+    # JWT_SECRET_KEYが未設定の場合はトークンを発行しない
+    access_token: Optional[str] = None
+    refresh_token: Optional[str] = None
+    token_type: Optional[str] = None
+    expires_in: Optional[int] = None
\ No newline at end of file
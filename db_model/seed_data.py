@@ -21,6 +21,7 @@ sys.path.insert(0, str(project_root))
 
 try:
     from db_connection.connect_MySQL import SessionLocal, engine, Base
+    from db_connection.embedding import get_text_embedding
     from db_model.tables import (
         User, Department, JoinForm, WelcomeLevel, SkillMaster, 
         DetailSkill, ContactMethod, Profile, PostSkill, 
@@ -79,7 +80,8 @@ def drop_and_create_tables():
                 CREATE TABLE departments (
                     id INTEGER NOT NULL AUTO_INCREMENT, 
                     name VARCHAR(100) NOT NULL, 
-                    PRIMARY KEY (id)
+                    PRIMARY KEY (id),
+                    INDEX idx_departments_name (name)
                 )
             """))
             
@@ -150,6 +152,7 @@ def drop_and_create_tables():
                     created_at DATETIME DEFAULT CURRENT_TIMESTAMP, 
                     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP, 
                     PRIMARY KEY (user_id), 
+                    INDEX idx_profiles_department_user (department_id, user_id),
                     FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
                     FOREIGN KEY(department_id) REFERENCES departments(id),
                     FOREIGN KEY(join_form_id) REFERENCES join_forms(id),
@@ -167,6 +170,7 @@ def drop_and_create_tables():
                     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP, 
                     PRIMARY KEY (id), 
                     UNIQUE KEY unique_user_skill (user_id, skill_id),
+                    INDEX idx_post_skills_skill_user (skill_id, user_id),
                     FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
                     FOREIGN KEY(skill_id) REFERENCES skill_masters(skill_id) ON DELETE CASCADE
                 )
@@ -212,6 +216,7 @@ def drop_and_create_tables():
                     created_at DATETIME DEFAULT CURRENT_TIMESTAMP, 
                     PRIMARY KEY (id), 
                     UNIQUE KEY unique_bookmark (bookmarking_user_id, bookmarked_user_id),
+                    INDEX idx_bookmarks_bookmarked_user (bookmarked_user_id, bookmarking_user_id),
                     FOREIGN KEY(bookmarking_user_id) REFERENCES users(id) ON DELETE CASCADE,
                     FOREIGN KEY(bookmarked_user_id) REFERENCES users(id) ON DELETE CASCADE
                 )
@@ -245,13 +250,9 @@ def verify_password(plain_password, hashed_password):
 
 # ダミーエンベディングを生成（実際には適切なエンベディングモデルを使用すべき）
 def create_dummy_embedding(text, dimension=384):
-    # OpenAIのエンベディングモデルを使用
+    # OpenAIのエンベディングモデルを使用（キャッシュ済みの場合はAPIを呼ばない）
     try:
-        response = openai.embeddings.create(
-            model=OPENAI_MODEL,
-            input=text
-        )
-        return response.data[0].embedding
+        return get_text_embedding(text)
     except Exception as e:
         print(f"OpenAIエンベディング生成エラー: {e}")
         # エラーの場合はランダムな埋め込みを返す
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Date, ForeignKey, UniqueConstraint, LargeBinary
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, Date, ForeignKey, UniqueConstraint, Index, LargeBinary
+from sqlalchemy.orm import relationship, deferred, column_property
 from sqlalchemy.sql import func
 from db_connection.connect_MySQL import Base
 
@@ -30,6 +30,11 @@ class Department(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False)
 
+    # インデックス（部署名での検索用）
+    __table_args__ = (
+        Index('idx_departments_name', 'name'),
+    )
+
     # リレーションシップ
     profiles = relationship("Profile", back_populates="department")
 
@@ -98,13 +103,24 @@ class Profile(Base):
     join_form_id = Column(Integer, ForeignKey("join_forms.id"), nullable=True)
     welcome_level_id = Column(Integer, ForeignKey("welcome_levels.id"), nullable=True)
     career = Column(Integer, nullable=True) # 社歴
-    image_data = Column(LargeBinary, nullable=True) # プロフィール画像データ
+    # 大きいカラムは遅延読み込みにし、必要なエンドポイントだけが明示的に読み込む
+    #   "image"        : image_data（画像本体。/users/{user_id}/image のみで使用）
+    #   "profile_text" : history, pr（undefer(Profile.pr) / undefer_group("profile_text") で読み込む）
+    image_data = deferred(Column(LargeBinary, nullable=True), group="image") # プロフィール画像データ
     image_data_type = Column(String(100), nullable=True) # プロフィール画像データの形式
-    history = Column(Text, nullable=True) # 経歴
-    pr = Column(Text, nullable=True) # 自己PR
+    history = deferred(Column(Text, nullable=True), group="profile_text") # 経歴
+    pr = deferred(Column(Text, nullable=True), group="profile_text") # 自己PR
     total_point = Column(Integer, default=0) # 付与ポイント数合計
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    # 画像の有無（画像本体を読み込まずに判定するためのSQL式）
+    has_image = column_property(image_data.columns[0].isnot(None))
+
+    # インデックス（部署ごとのユーザー一覧用。user_idまで含めてID順のページングもインデックスで行う）
+    __table_args__ = (
+        Index('idx_profiles_department_user', 'department_id', 'user_id'),
+    )
     
     # リレーションシップ
     user = relationship("User", back_populates="profile")
@@ -122,9 +138,11 @@ class PostSkill(Base):
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
-    # ユニーク制約
+    # ユニーク制約・インデックス
+    # unique_user_skillはuser_idが先頭のため、スキルからユーザーを引く検索用にskill_id先頭のインデックスを追加
     __table_args__ = (
         UniqueConstraint('user_id', 'skill_id', name='unique_user_skill'),
+        Index('idx_post_skills_skill_user', 'skill_id', 'user_id'),
     )
 
     # リレーションシップ
@@ -175,9 +193,11 @@ class Bookmark(Base):
     bookmarked_user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime, default=func.now())
     
-    # ユニーク制約
+    # ユニーク制約・インデックス
+    # ブックマークした側での検索はunique_bookmarkを使い、された側での検索用にインデックスを追加
     __table_args__ = (
         UniqueConstraint('bookmarking_user_id', 'bookmarked_user_id', name='unique_bookmark'),
+        Index('idx_bookmarks_bookmarked_user', 'bookmarked_user_id', 'bookmarking_user_id'),
     )
 
     # リレーションシップ
@@ -1,52 +1,120 @@
 from db_connection.connect_MySQL import SessionLocal
-from db_connection.connect_Pinecone import add_skill_to_pinecone
+from db_connection.connect_Pinecone import (
+    VECTOR_INDEX_MODE, create_pinecone_index, build_skill_vector, upsert_skill_vectors,
+    delete_vectors, user_vector_id, clear_search_cache
+)
+from db_connection.embedding import get_text_embedding_vectors
 from db_model.tables import SkillMaster, PostSkill, User
 
+# 1回のエンベディング生成でまとめて扱う (スキル, ユーザー) 行数
+LOAD_CHUNK_SIZE = 1000
+
+def iter_skill_user_rows(db):
+    """
+    全ての (スキル, ユーザー) の組を1回の結合クエリでストリーミング取得
+    スキル単位のインデックスではスキルだけを取得する（ユーザーは検索時にPostSkillから展開）
+    """
+    if VECTOR_INDEX_MODE == "skill":
+        skills = (
+            db.query(SkillMaster.skill_id, SkillMaster.name)
+            .order_by(SkillMaster.skill_id)
+            .execution_options(yield_per=LOAD_CHUNK_SIZE)
+        )
+        return ((skill_id, skill_name, None, None) for skill_id, skill_name in skills)
+
+    return (
+        db.query(SkillMaster.skill_id, SkillMaster.name, User.id, User.name)
+        .outerjoin(PostSkill, PostSkill.skill_id == SkillMaster.skill_id)
+        .outerjoin(User, User.id == PostSkill.user_id)
+        .order_by(SkillMaster.skill_id, User.id)
+        .execution_options(yield_per=LOAD_CHUNK_SIZE)
+    )
+
+def iter_user_vector_ids(db):
+    """
+    (スキル, ユーザー) 単位で登録していた頃のベクトルIDをPostSkillから作る
+    スキル単位のインデックスに切り替えた後、残っている古いベクトルを削除するために使う
+    """
+    rows = (
+        db.query(PostSkill.skill_id, PostSkill.user_id)
+        .order_by(PostSkill.skill_id, PostSkill.user_id)
+        .execution_options(yield_per=LOAD_CHUNK_SIZE)
+    )
+    return (user_vector_id(skill_id, user_id) for skill_id, user_id in rows)
+
+def iter_skill_vectors(rows):
+    """行をチャンクごとにまとめてベクトル化し、登録用のベクトルを順に返す"""
+    registered_skill_ids = set()
+    chunk = []
+
+    def vectors_for(chunk):
+        # チャンク内の重複しないスキル名だけをまとめてベクトル化
+        skill_names = list(dict.fromkeys(skill_name for _, skill_name, _, _ in chunk))
+        embeddings = {
+            skill_name: embedding.tolist()
+            for skill_name, embedding in zip(skill_names, get_text_embedding_vectors(skill_names))
+        }
+
+        for skill_id, skill_name, user_id, user_name in chunk:
+            embedding = embeddings[skill_name]
+
+            # スキル自体のベクトル
+            if skill_id not in registered_skill_ids:
+                registered_skill_ids.add(skill_id)
+                yield build_skill_vector(skill_id, skill_name, embedding)
+
+            # ユーザーごとのスキル情報のベクトル
+            if user_id is not None:
+                yield build_skill_vector(
+                    skill_id=skill_id,
+                    skill_name=skill_name,
+                    embedding=embedding,
+                    user_id=user_id,
+                    user_name=user_name or "名前なし"
+                )
+
+    for row in rows:
+        chunk.append(tuple(row))
+        if len(chunk) >= LOAD_CHUNK_SIZE:
+            yield from vectors_for(chunk)
+            chunk = []
+
+    if chunk:
+        yield from vectors_for(chunk)
+
 def load_skills_to_pinecone():
     """データベースからスキルデータを取得してPineconeに格納"""
-    print("スキルデータをPineconeに格納します...")
-    
+    print(f"スキルデータをPineconeに格納します（登録単位: {VECTOR_INDEX_MODE}）...")
+
     # データベース接続
     db = SessionLocal()
-    
+
     try:
-        # 全てのスキルを取得
-        all_skills = db.query(SkillMaster).all()
-        print(f"データベースから{len(all_skills)}件のスキルデータを取得しました。")
-        
-        # Pineconeにスキルを格納
-        for skill in all_skills:
-            # スキル自体をPineconeに追加
-            add_skill_to_pinecone(skill.skill_id, skill.name)
-            
-            # このスキルを持つユーザーを取得
-            users_with_skill = (
-                db.query(User)
-                .join(PostSkill, User.id == PostSkill.user_id)
-                .filter(PostSkill.skill_id == skill.skill_id)
-                .all()
-            )
-            
-            print(f"スキル '{skill.name}' を持つユーザー: {len(users_with_skill)}人")
-            
-            # ユーザーごとのスキル情報を追加
-            for user in users_with_skill:
-                add_skill_to_pinecone(
-                    skill_id=skill.skill_id,
-                    skill_name=skill.name,
-                    user_id=user.id,
-                    user_name=user.name or "名前なし"
-                )
-        
+        # インデックスがなければ作成（アプリの起動時には作成しない）
+        create_pinecone_index()
+
+        # (スキル, ユーザー) の組をストリーミングで取得し、バッチでベクトル化・登録
+        upserted = upsert_skill_vectors(iter_skill_vectors(iter_skill_user_rows(db)))
+        print(f"{upserted}件のベクトルをPineconeに格納しました。")
+
+        # スキル単位のインデックスでは、(スキル, ユーザー) 単位の古いベクトルを削除する
+        # （残っているとtop_kを重複したスキルで消費し、インデックスも小さくならない）
+        if VECTOR_INDEX_MODE == "skill":
+            requested = delete_vectors(iter_user_vector_ids(db))
+            print(f"(スキル, ユーザー) 単位の古いベクトル{requested}件の削除を指示しました。")
+
+        # 検索キャッシュは最後に1回だけクリア
+        clear_search_cache()
+
         print("スキルデータのPineconeへの格納が完了しました。")
-    
+
     except Exception as e:
         print(f"エラーが発生しました: {str(e)}")
         import traceback
         traceback.print_exc()
-    
+
     finally:
         db.close()
 
 if __name__ == "__main__":
-    load_skills_to_pinecone() 
\ No newline at end of file
+    load_skills_to_pinecone()
\ No newline at end of file